@@ -0,0 +1,123 @@
+from pathlib import Path
+import hashlib
+import json
+import mmap
+import os
+import struct
+import typing
+import pygame
+
+from .game_types import *
+
+PACK_MAGIC = b"BSPACK01"
+HEADER_STRUCT = struct.Struct("<8sI")
+
+class AssetPack:
+    # Decoded pixels for a list of source images, stored in one file which is
+    # memory-mapped, so that surfaces can be created without decoding or copying.
+    # The pack is rebuilt if any of the source images change. Source images are
+    # identified by their path relative to base_path, size and contents, as
+    # base_path may be different every time, e.g. a PyInstaller temporary directory.
+    def __init__(self, pack_path: Path, base_path: Path, source_paths: typing.List[Path],
+                 load_function: typing.Callable[[Path], SurfaceType]) -> None:
+        self.pack_path = pack_path
+        self.surfaces: typing.Dict[Path, SurfaceType] = {}
+        self.pack_file: typing.Optional[typing.BinaryIO] = None
+        self.pack_mmap: typing.Optional[mmap.mmap] = None
+
+        self.base_path = base_path
+        sources = [get_source_info(base_path, path) for path in source_paths]
+        if not self.open(sources):
+            try:
+                build_asset_pack(pack_path, source_paths, sources, load_function)
+            except OSError:
+                # The pack can't be written, e.g. read-only storage
+                return
+            self.open(sources)
+
+    def open(self, sources: typing.List[typing.Dict[str, typing.Any]]) -> bool:
+        try:
+            pack_file = open(self.pack_path, "rb")
+        except OSError:
+            return False
+
+        try:
+            pack_mmap = mmap.mmap(pack_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            pack_file.close()
+            return False
+
+        try:
+            (magic, header_size) = HEADER_STRUCT.unpack_from(pack_mmap, 0)
+            if magic != PACK_MAGIC:
+                raise ValueError("Not an asset pack")
+            header = json.loads(pack_mmap[HEADER_STRUCT.size:HEADER_STRUCT.size + header_size])
+            entries = header["entries"]
+            if [entry["source"] for entry in entries] != sources:
+                raise ValueError("Asset pack is out of date")
+
+            data_start = HEADER_STRUCT.size + header_size
+            for entry in entries:
+                (width, height) = entry["size"]
+                if (data_start + entry["offset"] + (width * height * 4)) > len(pack_mmap):
+                    raise ValueError("Asset pack is truncated")
+
+        except (ValueError, KeyError, TypeError, struct.error):
+            pack_mmap.close()
+            pack_file.close()
+            return False
+
+        # The surfaces refer to the mapped file, so it stays open
+        data = memoryview(pack_mmap)
+        for entry in entries:
+            (width, height) = entry["size"]
+            offset = data_start + entry["offset"]
+            self.surfaces[self.base_path / entry["source"]["path"]] = pygame.image.frombuffer(
+                    data[offset:offset + (width * height * 4)], (width, height), "RGBA")
+
+        self.pack_file = pack_file
+        self.pack_mmap = pack_mmap
+        return True
+
+    def get_surface(self, path: Path) -> typing.Optional[SurfaceType]:
+        return self.surfaces.get(path, None)
+
+def get_source_info(base_path: Path, path: Path) -> typing.Dict[str, typing.Any]:
+    data = path.read_bytes()
+    return {"path": path.relative_to(base_path).as_posix(), "file_size": len(data),
+            "sha256": hashlib.sha256(data).hexdigest()}
+
+def build_asset_pack(pack_path: Path, source_paths: typing.List[Path],
+                     sources: typing.List[typing.Dict[str, typing.Any]],
+                     load_function: typing.Callable[[Path], SurfaceType]) -> None:
+    pixels: typing.List[bytes] = []
+    entries: typing.List[typing.Dict[str, typing.Any]] = []
+    for (path, source) in zip(source_paths, sources):
+        surface = load_function(path)
+        pixels.append(pygame.image.tobytes(surface, "RGBA"))
+        entries.append({"source": source, "size": list(surface.get_size()), "offset": 0})
+
+    # Pixel data follows the header; the offsets are relative to the end of the header
+    offset = 0
+    for (entry, data) in zip(entries, pixels):
+        entry["offset"] = offset
+        offset += len(data)
+    header = json.dumps({"entries": entries}).encode("utf-8")
+    header += b" " * ((-len(header)) % 4)
+
+    # Write a new file and then replace the old one, so an incomplete pack is never used
+    temp_path = pack_path.with_name(pack_path.name + ".tmp")
+    try:
+        with open(temp_path, "wb") as fd:
+            fd.write(HEADER_STRUCT.pack(PACK_MAGIC, len(header)))
+            fd.write(header)
+            for data in pixels:
+                fd.write(data)
+        os.replace(temp_path, pack_path)
+    except OSError:
+        # e.g. the disk is full: don't leave an incomplete file behind
+        try:
+            temp_path.unlink()
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,187 @@
+import typing
+import pygame
+import os
+import json
+import time
+from pathlib import Path
+from pygame import Rect
+
+from .constants import *
+from .game_types import *
+from .director import Director
+from .deterministic_random import DeterministicRandom
+from .font import Font, WordLocations, TextLayout
+from .game_config import GameConfig
+from .images import Images, LockType
+from .display_format import display_format
+from .colour import Colour
+from .time_conv import time_conv
+
+BENCHMARK_SCREEN_SIZE = (1000, 500)
+BENCHMARK_MIN_TIME = 0.1
+BENCHMARK_REPEAT = 3
+BENCHMARK_TEXT = """
+To complete each level, select matching tiles. When a tile is selected, it's marked with a bone.
+The level is complete when all of the tiles match and are marked with a bone.
+Tiles that are not marked will change periodically.
+"""
+
+def measure(function: typing.Callable[[int], typing.Any],
+            min_time: float = BENCHMARK_MIN_TIME,
+            repeat: int = BENCHMARK_REPEAT) -> float:
+    # Return the number of calls per second, calling function(i) for i = 0, 1, 2, ...
+    # The best of several runs is used, as other activity can only slow things down.
+    function(0)
+    best = 0.0
+    count = 0
+    for r in range(repeat):
+        batch = 1
+        calls = 0
+        start = time.perf_counter()
+        elapsed = 0.0
+        while elapsed < min_time:
+            for i in range(count, count + batch):
+                function(i)
+            count += batch
+            calls += batch
+            batch *= 2
+            elapsed = time.perf_counter() - start
+        best = max(best, calls / elapsed)
+    return best
+
+def get_benchmark_sizes() -> typing.List[GameConfig]:
+    # One GameConfig for each distinct grid size and number of values in levels 1 .. 100
+    game_configs: typing.List[GameConfig] = []
+    seen: typing.Set[typing.Tuple[int, int, int]] = set()
+    for level_id in range(1, 101):
+        game_config = GameConfig(level_id, 0)
+        key = (game_config.width, game_config.height, game_config.num_values)
+        if key not in seen:
+            seen.add(key)
+            game_configs.append(game_config)
+    return game_configs
+
+def run_benchmarks(root_path: Path) -> typing.Dict[str, float]:
+    results: typing.Dict[str, float] = {}
+    screen_area = pygame.display.set_mode(size=BENCHMARK_SCREEN_SIZE)
+    display_format.update()
+    images = Images(root_path / "img")
+    font = Font(root_path / "font")
+
+    # Simulation and rendering of the game area, for each grid size
+    for game_config in get_benchmark_sizes():
+        name = (f"level {game_config.level_id} "
+                f"({game_config.width}x{game_config.height}x{game_config.num_values})")
+        director = Director(game_config)
+        results[f"Director.update {name}"] = measure(lambda i: director.update())
+
+        toggle_director = Director(game_config)
+        results[f"Grid.toggle {name}"] = measure(lambda i: toggle_director.grid.toggle(
+                    (i % game_config.width, (i // game_config.width) % game_config.height)))
+
+        # Drawing needs a background colour for each value
+        images.prepare(game_config)
+        if len(images.backgrounds) < game_config.num_values:
+            print(f"Skipping drawing for {name}: not enough background colours")
+            continue
+
+        cell_size = min(BENCHMARK_SCREEN_SIZE[0] // game_config.width,
+                        BENCHMARK_SCREEN_SIZE[1] // game_config.height)
+        game_area = screen_area.subsurface(Rect(0, 0, cell_size * game_config.width,
+                                                cell_size * game_config.height))
+        cell_rect = Rect(0, 0, cell_size, cell_size)
+
+        results[f"Director.draw {name}"] = measure(lambda i: director.draw(game_area, images))
+        results[f"Images.draw {name}"] = measure(lambda i: images.draw(
+                    value=i % game_config.num_values, game_area=game_area, cell_rect=cell_rect,
+                    lock_type=LockType.LOCK_GOOD, brightness=i % 256))
+
+    # Blitting surfaces in their original format, and in the display format
+    tile_size = (100, 100)
+    unconverted = {"opaque": pygame.transform.smoothscale(images.backgrounds[0].scale_from, tile_size),
+                   "alpha": pygame.transform.smoothscale(images.all_images[0].scale_from, tile_size)}
+    for (kind, surface) in unconverted.items():
+        converted = display_format.convert(surface)
+        results[f"blit {kind} unconverted"] = measure(lambda i: screen_area.blit(surface, (0, 0)))
+        results[f"blit {kind} converted"] = measure(lambda i: screen_area.blit(converted, (0, 0)))
+
+    # Text rendering. The states make a new Colour for each draw, so the benchmarks do too
+    text_area = screen_area.subsurface(Rect(0, 0, 600, 40))
+    results["Font.draw cached"] = measure(lambda i: font.draw(
+                text_area=text_area, text="SCORE 0   COMBO 0   TIME 0'00\"00", colour=Colour(240, 240, 240)))
+    results["Font.draw uncached"] = measure(lambda i: font.draw(
+                text_area=text_area, text=f"SCORE {i}   COMBO {i % 10}   TIME {time_conv(i)}",
+                colour=Colour(240, 240, 240)))
+    results["Font.draw_dynamic"] = measure(lambda i: font.draw_dynamic(
+                text_area=text_area, text=f"SCORE {i}   COMBO {i % 10}   TIME {time_conv(i)}",
+                colour=Colour(240, 240, 240)))
+    container_rect = Rect(0, 0, 800, 300)
+    results["WordLocations"] = measure(lambda i: WordLocations(
+                text=BENCHMARK_TEXT, container_rect=container_rect, size=20,
+                horizontal_align=0, vertical_align=0, font=font))
+    results["TextLayout.get_fitting_size"] = measure(lambda i: TextLayout(
+                text=BENCHMARK_TEXT, container_rect=Rect(0, 0, 400 + (i % 400), 300),
+                font=font).get_fitting_size())
+
+    # Random numbers
+    rng = DeterministicRandom(1, 0)
+    results["DeterministicRandom.rand"] = measure(lambda i: rng.rand())
+
+    # Cache effectiveness during the benchmarks
+    cache_stats = images.get_cache_stats()
+    cache_stats.update(font.get_cache_stats())
+    for (name, stats) in cache_stats.items():
+        print(f"{name:30s} " + " ".join(f"{key} {value}" for (key, value) in stats.items()))
+    return results
+
+def benchmark(root_path: Path,
+              baseline_path: typing.Optional[Path] = None,
+              save_path: typing.Optional[Path] = None,
+              threshold_percent: int = 20) -> int:
+    # Runs headless: returns 1 if anything is more than threshold_percent slower than the baseline
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    pygame.display.init()
+    pygame.font.init()
+    try:
+        results = run_benchmarks(root_path)
+    finally:
+        pygame.quit()
+
+    baseline: typing.Dict[str, float] = {}
+    if (baseline_path is not None) and baseline_path.is_file():
+        with open(baseline_path, "rt", encoding="utf-8") as fd:
+            baseline = json.load(fd)
+    else:
+        print("No baseline, so nothing is compared: use --benchmark-save to write one")
+
+    regressions = 0
+    for (name, ops_per_sec) in results.items():
+        print(f"{name:45s} {ops_per_sec:12.1f} ops/s {1000.0 / ops_per_sec:9.3f} ms", end="")
+        if name in baseline:
+            change = ((ops_per_sec / baseline[name]) - 1.0) * 100.0
+            print(f" {change:+7.1f}%", end="")
+            if change < -threshold_percent:
+                print(" REGRESSION", end="")
+                regressions += 1
+        print()
+
+    # Does a game frame fit in the frame budget?
+    for game_config in get_benchmark_sizes():
+        name = (f"level {game_config.level_id} "
+                f"({game_config.width}x{game_config.height}x{game_config.num_values})")
+        if f"Director.draw {name}" not in results:
+            continue
+        frame_ms = ((1000.0 / results[f"Director.update {name}"])
+                    + (1000.0 / results[f"Director.draw {name}"]))
+        if frame_ms > ONE_FRAME_TIME_MS:
+            print(f"Frame for {name} takes {frame_ms:.3f} ms, over budget of {ONE_FRAME_TIME_MS} ms")
+            regressions += 1
+
+    if save_path is not None:
+        with open(save_path, "wt", encoding="utf-8") as fd:
+            json.dump(results, fd, indent=1)
+
+    if regressions:
+        print(f"{regressions} regression(s)")
+        return 1
+    return 0
@@ -13,3 +13,21 @@ MAX_CACHE_SIZE = 500
 NUM_BUTTONS = 5
 ONE_FRAME_TIME_MS = 1000 // FRAME_RATE_HZ
 MAX_SKIP_TIME_MS = 2000
+BRIGHTNESS_STEP = 5
+MEGABYTE = 1024 * 1024
+MAX_TILE_CACHE_BYTES = 16 * MEGABYTE
+MAX_BACKGROUND_CACHE_SIZE = 2 * MAX_NUM_VALUES
+MAX_SCALED_IMAGE_BYTES = 32 * MEGABYTE
+MIN_FONT_SIZE = 4
+MAX_FONT_SIZE = 99
+ESTIMATE_FONT_SIZE = 50
+GLYPH_ATLAS_CHARACTERS = "0123456789'\":.-"
+DIGITS_TO_ZERO = str.maketrans("123456789", "000000000")
+MAX_GLYPH_ATLAS_CACHE_SIZE = 20
+MAX_TEXT_CACHE_BYTES = 16 * MEGABYTE
+MAX_SIZE_CACHE_SIZE = 10 * MAX_CACHE_SIZE
+IDLE_WAIT_TIMEOUT_MS = 1000
+WRITE_BEHIND_DELAY_S = 0.5
+SCORE_INDEX_INITIAL_SIZE = 128
+LAST_PLAYED_STEP_S = 0.000001
+NUM_SCORE_SUMS = 4
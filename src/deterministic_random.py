@@ -1,27 +1,72 @@
 import hashlib, struct, typing
 
 MASK = (1 << 32) - 1
+BLOCK_SIZE = 8  # values per SHA-256 digest
+BLOCK_STRUCT = struct.Struct("<IIII")
+VALUES_STRUCT = struct.Struct(f"<{BLOCK_SIZE}I")
 
 class DeterministicRandom:
     def __init__(self, level_id: int, seed: int) -> None:
         self.level_id = level_id
         self.seed = seed
-        self.sequence = 0
-        self.buffer = b""
+        self.sequence = 0               # next block to be generated
+        self.block: typing.Tuple[int, ...] = ()
+        self.position = 0               # next value within self.block
 
-    def rand(self) -> int:
-        if len(self.buffer) < 4:
-            self.buffer = hashlib.sha256(struct.pack("<IIII",
+    def get_block(self, sequence: int) -> typing.Tuple[int, ...]:
+        return VALUES_STRUCT.unpack(hashlib.sha256(BLOCK_STRUCT.pack(
                     self.level_id & MASK,
                     self.seed,
-                    self.sequence & MASK,
-                    0)).digest()
+                    sequence & MASK,
+                    0)).digest())
+
+    def tell(self) -> int:
+        # Number of values that have been taken from the stream so far
+        if len(self.block) == 0:
+            return self.sequence * BLOCK_SIZE
+        return ((self.sequence - 1) * BLOCK_SIZE) + self.position
+
+    def seek(self, index: int) -> None:
+        # Continue the stream from value number index, as if index values had been taken
+        assert index >= 0
+        (sequence, position) = divmod(index, BLOCK_SIZE)
+        if position == 0:
+            self.sequence = sequence
+            self.block = ()
+        else:
+            self.sequence = sequence + 1
+            self.block = self.get_block(sequence)
+        self.position = position
+
+    def skip(self, count: int) -> None:
+        # Jump ahead by count values
+        self.seek(self.tell() + count)
+
+    def rand(self) -> int:
+        if self.position >= len(self.block):
+            self.block = self.get_block(self.sequence)
             self.sequence += 1
-        (value, ) = struct.unpack("<I", self.buffer[:4])
-        self.buffer = self.buffer[4:]
+            self.position = 0
+        value = self.block[self.position]
+        self.position += 1
         return value
 
+    def rand_many(self, count: int) -> typing.List[int]:
+        values = list(self.block[self.position:self.position + count])
+        self.position += len(values)
+        while len(values) < count:
+            self.block = self.get_block(self.sequence)
+            self.sequence += 1
+            self.position = min(BLOCK_SIZE, count - len(values))
+            values.extend(self.block[:self.position])
+        return values
+
     def randrange(self, low: int, high: int) -> int:
         size = high - low
         assert size > 0
         return (self.rand() % size) + low
+
+    def randrange_many(self, low: int, high: int, count: int) -> typing.List[int]:
+        size = high - low
+        assert size > 0
+        return [(value % size) + low for value in self.rand_many(count)]
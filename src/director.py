@@ -1,3 +1,5 @@
+import array
+import collections
 import typing
 import pygame
 
@@ -19,58 +21,100 @@ class Director:
         self.plan_sequence = PLAN_PERIOD_FRAMES - 1
         self.flash_sequence = 0
 
+        # Pending changes from all active patterns, keyed by the frame when they happen
+        self.frame = 0
+        self.changes: typing.Dict[int, typing.List[typing.Tuple[BasePattern, int]]]
+        self.changes = collections.defaultdict(lambda: [])
+        self.expiries: typing.Dict[int, typing.List[BasePattern]] = collections.defaultdict(lambda: [])
+
+        # Highlighting for each cell, indexed by (y * width) + x, computed once per frame
+        self.brightness_map = array.array("B", bytes(self.grid.size))
+        self.brightness_frame = -1
+
+        # Appearance of each cell when it was last drawn
+        self.drawn: typing.List[typing.Optional[typing.Tuple[int, LockType, int]]] = []
+
     def update(self) -> None:
+        self.frame += 1
         self.plan_sequence += 1
-        i = 0
-        while i < len(self.patterns):
-            pattern = self.patterns[i]
-            pattern.update(self.grid)
-            if pattern.is_done():
-                self.patterns.pop(i)
-            else:
-                i += 1
+        for (pattern, time) in self.changes.pop(self.frame, ()):
+            pattern.apply_plan(self.grid, time)
+
+        for pattern in self.expiries.pop(self.frame, ()):
+            self.patterns.remove(pattern)
 
         if self.plan_sequence >= PLAN_PERIOD_FRAMES:
             self.plan_sequence -= PLAN_PERIOD_FRAMES
-            pattern_class = PATTERNS[self.rng.randrange(0, len(PATTERNS))]
-            pattern = pattern_class()
-            pattern.make_plan(self.rng, self.game_config)
-            pattern.analyse_plan()
-            self.patterns.append(pattern)
+            self.add_pattern(self.make_pattern())
 
         self.flash_sequence += 1
         if self.flash_sequence >= FLASH_INTERVAL_FRAMES:
             self.flash_sequence = 0
 
-    def draw(self, game_area: SurfaceType, images: Images) -> None:
+    def make_pattern(self) -> BasePattern:
+        pattern_class = PATTERNS[self.rng.randrange(0, len(PATTERNS))]
+        pattern = pattern_class()
+        pattern.make_plan(self.rng, self.game_config)
+        return pattern
+
+    def add_pattern(self, pattern: BasePattern) -> None:
+        pattern.start_frame = self.frame
+        for time in pattern.plan:
+            self.changes[self.frame + PLAN_LEADIN_FRAMES + time].append((pattern, time))
+        self.expiries[pattern.get_end_frame()].append(pattern)
+        self.patterns.append(pattern)
+
+    def get_brightness_map(self) -> "array.array[int]":
+        if self.brightness_frame != self.frame:
+            self.brightness_frame = self.frame
+            self.brightness_map = array.array("B", bytes(self.grid.size))
+            for pattern in self.patterns:
+                pattern.add_brightness(self.brightness_map, self.frame)
+        return self.brightness_map
+
+    def draw(self, game_area: SurfaceType, images: Images,
+             redraw_all: bool = True) -> typing.List[RectType]:
+        # Draw cells that changed since the last draw (or all cells),
+        # returning the areas that were drawn
+        if redraw_all:
+            self.drawn = [None] * self.grid.size
+
         game_rect = game_area.get_rect()
         largest_lock_group: typing.Optional[int] = None
         if self.flash_sequence < FLASH_DURATION_FRAMES:
             largest_lock_group = self.grid.get_largest_lock_group()
 
+        brightness_map = self.get_brightness_map()
+        lock_values = self.grid.lock_values
+        locked = self.grid.locked
+        drawn = self.drawn
+        dirty_rects: typing.List[RectType] = []
+        index = 0
         for y in range(self.game_config.height):
             for x in range(self.game_config.width):
-                brightness = 0
-                for pattern in self.patterns:
-                    brightness = max(brightness, pattern.get_brightness((x, y)))
-
-                cell = self.grid.get_cell((x, y))
-                assert cell is not None
-
+                brightness = brightness_map[index]
+                value = lock_values[index]
                 lock_type = LockType.UNLOCK 
-                if cell.is_locked():
+                if locked[index]:
                     if ((largest_lock_group is not None)
-                    and (cell.get_lock_group() != largest_lock_group)):
+                    and (value != largest_lock_group)):
                         lock_type = LockType.LOCK_BAD
                     else:
                         lock_type = LockType.LOCK_GOOD
 
-                cell_rect = self.grid.get_cell_rect(game_rect, (x, y))
-                images.draw(value=cell.get_value(),
-                            lock_type=lock_type,
-                            brightness=brightness,
-                            game_area=game_area,
-                            cell_rect=cell_rect)
+                appearance = (value, lock_type, brightness)
+                if drawn[index] != appearance:
+                    drawn[index] = appearance
+                    cell_rect = self.grid.get_cell_rect(game_rect, (x, y))
+                    images.draw(value=value,
+                                lock_type=lock_type,
+                                brightness=brightness,
+                                game_area=game_area,
+                                cell_rect=cell_rect)
+                    dirty_rects.append(cell_rect)
+                index += 1
+
+        return dirty_rects
 
     def is_complete(self) -> bool:
         return self.grid.is_complete()
@@ -84,18 +128,22 @@ class Director:
         cy = self.game_config.height // 2
         counter = 0
         max_distance = self.game_config.width + self.game_config.height
+        lock_values = self.grid.lock_values
+        locked = self.grid.locked
         while (not self.grid.is_complete()) and (counter < counter_limit):
             # Find the best place to lock - nearest the current place
             fallback_distance = best_distance = max_distance
             best_xy: typing.Optional[GridXY] = None
             fallback_xy: GridXY = (cx, cy)
+            index = 0
             for y in range(self.game_config.height):
                 for x in range(self.game_config.width):
-                    cell = self.grid.get_cell((x, y))
-                    assert cell is not None
                     dist = abs(x - cx) + abs(y - cy)
-                    if not cell.is_locked():
-                        if cell.get_value() == lock_group:
+                    is_locked = locked[index]
+                    value = lock_values[index]
+                    index += 1
+                    if not is_locked:
+                        if value == lock_group:
                             # This is a correct cell to lock
                             if dist < best_distance:
                                 best_distance = dist
@@ -0,0 +1,35 @@
+import typing
+import pygame
+
+from .game_types import *
+
+class DisplayFormat:
+    # Surfaces that are blitted often are converted to the pixel format of the
+    # display once, so that each blit does not have to convert every pixel.
+    # Caches compare their generation with this one, and discard their surfaces
+    # when the display format has changed, e.g. after the display surface is recreated.
+    def __init__(self) -> None:
+        self.format_key: typing.Optional[typing.Tuple[int, typing.Tuple[int, ...]]] = None
+        self.generation = 0
+
+    def update(self) -> bool:
+        # Called whenever the display surface may have changed; returns True if the format changed
+        screen = pygame.display.get_surface() if pygame.display.get_init() else None
+        format_key = None
+        if screen is not None:
+            format_key = (screen.get_bitsize(), tuple(screen.get_masks()))
+        if format_key == self.format_key:
+            return False
+        self.format_key = format_key
+        self.generation += 1
+        return True
+
+    def convert(self, surface: SurfaceType) -> SurfaceType:
+        # Return a copy of surface in the display format, keeping per-pixel alpha if it has any
+        if self.format_key is None:
+            return surface
+        if surface.get_flags() & pygame.SRCALPHA:
+            return surface.convert_alpha()
+        return surface.convert()
+
+display_format = DisplayFormat()
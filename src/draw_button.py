@@ -7,16 +7,22 @@ from .colour import Colour
 from .font import Font
 
 
+def get_button_inner_rect(button_outer_rect: RectType) -> RectType:
+    # The button is highlighted when the mouse is within this area
+    x = max(button_outer_rect.height // 20, 2)
+    button_inner_rect = Rect(button_outer_rect)
+    button_inner_rect.width -= x * 2
+    button_inner_rect.height -= x * 2
+    button_inner_rect.center = button_outer_rect.center
+    return button_inner_rect
+
 def draw_button(screen_area: SurfaceType, button_outer_rect: RectType,
                 text: str, mouse_pos: ScreenXY, font: Font,
                 variant: Variant) -> None:
 
     # Make border
     x = max(button_outer_rect.height // 20, 2)
-    button_inner_rect = Rect(button_outer_rect)
-    button_inner_rect.width -= x * 2
-    button_inner_rect.height -= x * 2
-    button_inner_rect.center = button_outer_rect.center
+    button_inner_rect = get_button_inner_rect(button_outer_rect)
 
     button_text_rect = Rect(button_inner_rect)
     button_text_rect.width -= x * 2
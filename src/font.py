@@ -6,132 +6,357 @@ from pygame import Rect
 from .game_types import *
 from .constants import *
 from .colour import Colour
+from .display_format import display_format
+from .lru_cache import LRUCache, get_surface_bytes
 
 class Font:
-    def __init__(self, path: Path) -> None:
+    def __init__(self, path: Path, draw_cache_bytes: int = MAX_TEXT_CACHE_BYTES) -> None:
         self.path = path
         self.font_file = path / "DejaVuSans.ttf"
-        self.font_cache: typing.Dict[typing.Any, pygame.font.Font] = {}
-        self.size_cache: typing.Dict[typing.Any, ScreenXY] = {}
-        self.draw_cache: typing.Dict[typing.Any, SurfaceType] = {}
+        self.font_cache: LRUCache[int, pygame.font.Font] = LRUCache(MAX_CACHE_SIZE)
+        self.size_cache: LRUCache[typing.Tuple[str, int], ScreenXY] = LRUCache(MAX_SIZE_CACHE_SIZE)
+        self.draw_cache: LRUCache[typing.Any, typing.Tuple[SurfaceType, ScreenXY]]
+        self.draw_cache = LRUCache(draw_cache_bytes, lambda entry: get_surface_bytes(entry[0]))
+        self.draw_cache_display_format_generation = display_format.generation
+        self.dynamic_layout_cache: LRUCache[typing.Any, typing.Tuple[int, typing.List[ScreenXY]]]
+        self.dynamic_layout_cache = LRUCache(MAX_CACHE_SIZE)
+        self.glyph_atlas_cache: LRUCache[typing.Tuple[int, ColourType], GlyphAtlas]
+        self.glyph_atlas_cache = LRUCache(MAX_GLYPH_ATLAS_CACHE_SIZE)
+
+    def get_cache_stats(self) -> typing.Dict[str, typing.Dict[str, int]]:
+        return {"Font.font_cache": self.font_cache.get_stats(),
+                "Font.size_cache": self.size_cache.get_stats(),
+                "Font.draw_cache": self.draw_cache.get_stats(),
+                "Font.dynamic_layout_cache": self.dynamic_layout_cache.get_stats(),
+                "Font.glyph_atlas_cache": self.glyph_atlas_cache.get_stats()}
 
     def get_font(self, font_size: int) -> pygame.font.Font:
-        font = self.font_cache.get(font_size, None)
+        font = self.font_cache.get(font_size)
         if font is None:
-            if len(self.font_cache) >= MAX_CACHE_SIZE:
-                self.font_cache.clear()
-            self.font_cache[font_size] = font = pygame.font.Font(str(self.font_file), font_size)
+            font = pygame.font.Font(str(self.font_file), font_size)
+            self.font_cache.put(font_size, font)
         return font
 
     def get_size(self, text: str, font_size: int) -> ScreenXY:
         key = (text, font_size)
-        size = self.size_cache.get(key, None)
+        size = self.size_cache.get(key)
         if size is None:
-            font = self.get_font(font_size)
-            if len(self.size_cache) >= MAX_CACHE_SIZE:
-                self.size_cache.clear()
-            self.size_cache[key] = size = font.size(text)
+            size = self.get_font(font_size).size(text)
+            self.size_cache.put(key, size)
         return size
 
     def draw(self, text_area: SurfaceType, text: str, colour: "Colour",
                 horizontal_align = 0,
                 vertical_align = 0) -> None:
 
-        # Cached?
+        # Cached? The cached surfaces are in the display format. Callers make a new
+        # Colour for each draw, so the key uses the RGB value
+        self.check_display_format()
         text_rect = text_area.get_rect()
-        key = (text, text_rect.size, colour, horizontal_align, vertical_align)
-        draw_area = self.draw_cache.get(key, None)
-        if draw_area is not None:
-            text_area.blit(draw_area, (0, 0))
+        key = (text, text_rect.size, colour.get_rgb(), horizontal_align, vertical_align)
+        cached = self.draw_cache.get(key)
+        if cached is not None:
+            (draw_area, draw_xy) = cached
+            text_area.blit(draw_area, draw_xy)
             return
 
         # Not cached - start from the beginning
-        draw_area = pygame.Surface(text_rect.size, pygame.SRCALPHA)
-
         # We will now fit the text to the available space, finding the largest size that fits
-        low_size = 4
-        high_size = 100
-        while low_size < (high_size - 1):
-            size = (low_size + high_size) // 2
-            try:
-                WordLocations(text=text, container_rect=text_rect,
-                              size=size, horizontal_align=-1,
-                              vertical_align=-1, font=self)
-                low_size = size
-            except TooBigError:
-                high_size = size
-
-        # Determine the word locations again for the given size
-        size = low_size
+        layout = TextLayout(text=text, container_rect=text_rect, font=self)
+        size = layout.get_fitting_size()
         try:
-            WordLocations(text=text, container_rect=text_rect,
-                          size=size, horizontal_align=horizontal_align,
-                          vertical_align=vertical_align,
-                          font=self).render(draw_area, self.get_font(size), colour.get_rgb())
+            word_locations = layout.get_word_locations(size=size, horizontal_align=horizontal_align,
+                                                       vertical_align=vertical_align)
         except TooBigError:
             # The text cannot be rendered at all
-            pass
+            word_locations = None
+
+        # Only the part of the text area covered by the text is kept
+        words: typing.List[typing.Tuple[SurfaceType, RectType]] = []
+        if word_locations is not None:
+            words = word_locations.render_words(self.get_font(size), colour.get_rgb())
+        draw_rect = Rect(0, 0, 0, 0)
+        if len(words) != 0:
+            draw_rect = words[0][1].unionall([r for (_, r) in words[1:]]).clip(text_rect)
+        draw_area = pygame.Surface(draw_rect.size, pygame.SRCALPHA)
+        for (word_surface, r) in words:
+            draw_area.blit(word_surface, (r.left - draw_rect.left, r.top - draw_rect.top))
+
+        draw_area = display_format.convert(draw_area)
+        draw_xy = draw_rect.topleft
 
         # Cache management
-        if len(self.draw_cache) >= MAX_CACHE_SIZE:
-            self.draw_cache.clear()
-        self.draw_cache[key] = draw_area
+        self.draw_cache.put(key, (draw_area, draw_xy))
 
         # Draw
-        text_area.blit(draw_area, (0, 0))
+        text_area.blit(draw_area, draw_xy)
+
+    def check_display_format(self) -> None:
+        if self.draw_cache_display_format_generation != display_format.generation:
+            self.draw_cache.clear()
+            self.glyph_atlas_cache.clear()
+            self.draw_cache_display_format_generation = display_format.generation
+
+    def get_glyph_atlas(self, font_size: int, colour: ColourType) -> "GlyphAtlas":
+        key = (font_size, colour)
+        glyph_atlas = self.glyph_atlas_cache.get(key)
+        if glyph_atlas is None:
+            glyph_atlas = GlyphAtlas(self.get_font(font_size), colour)
+            self.glyph_atlas_cache.put(key, glyph_atlas)
+        return glyph_atlas
+
+    def draw_dynamic(self, text_area: SurfaceType, text: str, colour: "Colour",
+                horizontal_align = 0,
+                vertical_align = 0) -> None:
+        # Draw text which changes often, such as a score or a time, without
+        # caching the result. All digits have the same width, so the layout
+        # only depends on the text with each digit replaced by "0", and the
+        # digits are drawn from a glyph atlas. The size is the same as draw() would use.
+        self.check_display_format()
+        text_rect = text_area.get_rect()
+        key = (text.translate(DIGITS_TO_ZERO), text_rect.size, horizontal_align, vertical_align)
+        dynamic_layout = self.dynamic_layout_cache.get(key)
+        if dynamic_layout is None:
+            layout = TextLayout(text=key[0], container_rect=text_rect, font=self)
+            size = layout.get_fitting_size()
+            word_xys: typing.List[ScreenXY] = []
+            try:
+                word_locations = layout.get_word_locations(size=size, horizontal_align=horizontal_align,
+                                                           vertical_align=vertical_align)
+                for (r, word) in word_locations.word_loc:
+                    word_xys.append((r.left + word_locations.text_rect.left,
+                                     r.top + word_locations.text_rect.top))
+            except TooBigError:
+                # The text cannot be rendered at all
+                pass
+
+            dynamic_layout = (size, word_xys)
+            self.dynamic_layout_cache.put(key, dynamic_layout)
+
+        (size, word_xys) = dynamic_layout
+        glyph_atlas = self.get_glyph_atlas(size, colour.get_rgb())
+        if not glyph_atlas.tabular:
+            # Digits have different widths at this size
+            self.draw(text_area, text, colour, horizontal_align, vertical_align)
+            return
+
+        for (xy, word) in zip(word_xys, text.split()):
+            glyph_atlas.draw(text_area, word, xy)
+
+class GlyphAtlas:
+    # Glyphs for one font size and colour, rendered once into a single surface.
+    # Words made of these glyphs are drawn one glyph at a time, which gives the
+    # same result as rendering the whole word, since the glyphs don't overlap.
+    # Other words are rendered whole and cached.
+    def __init__(self, font: pygame.font.Font, colour: ColourType) -> None:
+        self.font = font
+        self.colour = colour
+        self.glyph_rects: typing.Dict[str, RectType] = {}
+        self.word_cache: LRUCache[str, SurfaceType] = LRUCache(MAX_CACHE_SIZE)
+
+        glyphs = [font.render(c, True, colour) for c in GLYPH_ATLAS_CHARACTERS]
+        self.surface = pygame.Surface((sum(glyph.get_width() for glyph in glyphs),
+                                       max(glyph.get_height() for glyph in glyphs)), pygame.SRCALPHA)
+        x = 0
+        for (c, glyph) in zip(GLYPH_ATLAS_CHARACTERS, glyphs):
+            self.surface.blit(glyph, (x, 0))
+            self.glyph_rects[c] = Rect(x, 0, glyph.get_width(), glyph.get_height())
+            x += glyph.get_width()
+        self.surface = display_format.convert(self.surface)
+
+        # Each glyph must fill exactly its advance, and all digits must have the same advance
+        advances: typing.Set[int] = set()
+        for (c, metrics) in zip(GLYPH_ATLAS_CHARACTERS, font.metrics(GLYPH_ATLAS_CHARACTERS)):
+            if (metrics is None) or (metrics[0] < 0) or (metrics[1] > metrics[4]):
+                self.tabular = False
+                return
+            if metrics[4] != self.glyph_rects[c].width:
+                self.tabular = False
+                return
+            if c.isdigit():
+                advances.add(metrics[4])
+        self.tabular = (len(advances) == 1)
+
+    def draw(self, target: SurfaceType, word: str, xy: ScreenXY) -> None:
+        (x, y) = xy
+        glyph_rects = self.glyph_rects
+        for c in word:
+            if c not in glyph_rects:
+                break
+        else:
+            for c in word:
+                r = glyph_rects[c]
+                target.blit(self.surface, (x, y), r)
+                x += r.width
+            return
+
+        surface = self.word_cache.get(word)
+        if surface is None:
+            surface = display_format.convert(self.font.render(word, True, self.colour))
+            self.word_cache.put(word, surface)
+        target.blit(surface, (x, y))
 
 class TooBigError(Exception):
     pass
 
-class WordLocations:
-    def __init__(self, text: str, container_rect: RectType, size: int,
-                horizontal_align: int, vertical_align: int, font: Font) -> None:
-        # Here is the available space for the text
-        self.container_rect = container_rect
+class LineBreaks:
+    # Where the words of some text go at one font size, aligned left and top,
+    # as (x, y, w, h, word). The text does not fit if any word goes below max_height.
+    def __init__(self, lines: typing.List[typing.List[str]], width: int, max_height: int,
+                 size: int, font: Font) -> None:
+        self.word_loc: typing.List[typing.Tuple[int, int, int, int, str]] = []
+        self.row_width: typing.Dict[int, int] = {}
+        self.height = 0
+        self.fits = True
 
-        # Here are the locations of the words
-        self.word_loc: typing.List[typing.Tuple[RectType, str]] = []
-
-        # Plan where the words would be, assuming this size, and align left and align top.
-        max_width = 0
-        max_height = 0
-        row_width: typing.Dict[int, int] = {}
+        # Each distinct word is measured once
+        word_sizes: typing.Dict[str, ScreenXY] = {}
         y = 0
-        for line in text.split("\n"):
-            words = line.split()
+        for words in lines:
             x = 0
             line_height = 0
             for word in words:
-                (w, h) = font.get_size(" " + word, size)
-                if (w + x) > self.container_rect.width:
+                wh = word_sizes.get(word, None)
+                if wh is None:
+                    word_sizes[word] = wh = font.get_size(" " + word, size)
+                (w, h) = wh
+                if (w + x) > width:
                     # Wrap to next line
-                    y += line_height 
+                    y += line_height
                     x = 0
-                    self.word_loc.append((Rect(x, y, w, h), word))
-                    x += w
                     line_height = h
-                else:
-                    # Add to current line
-                    self.word_loc.append((Rect(x, y, w, h), word))
-                    x += w
-                    line_height = max(h, line_height)
-
-                row_width[y] = x
-                max_width = max(x, max_width)
-                max_height = y + line_height
-                if max_height > self.container_rect.height:
-                    # Ran out of space
-                    raise TooBigError()
+                elif h > line_height:
+                    line_height = h
+
+                # Add to current line
+                self.word_loc.append((x, y, w, h, word))
+                x += w
+                self.row_width[y] = x
+                self.height = y + line_height
+
+            if words and (self.height > max_height):
+                # Ran out of space; blank lines are not checked, as before
+                self.fits = False
 
             # Allow for blank lines
             if line_height == 0:
                 (w, h) = font.get_size("X", size)
                 line_height = h
-                max_height = y + line_height
+                self.height = y + line_height
 
             # Always go to a new line
             y += line_height
-            x = 0
+
+class TextLayout:
+    # Finds the largest font size at which some text fits in container_rect.
+    # The line breaks for each size are kept, so the final layout reuses the
+    # result of the search.
+    def __init__(self, text: str, container_rect: RectType, font: Font) -> None:
+        self.container_rect = container_rect
+        self.font = font
+        self.lines = [line.split() for line in text.split("\n")]
+        self.line_breaks: typing.Dict[int, LineBreaks] = {}
+
+    def get_line_breaks(self, size: int) -> LineBreaks:
+        line_breaks = self.line_breaks.get(size, None)
+        if line_breaks is None:
+            self.line_breaks[size] = line_breaks = LineBreaks(
+                    lines=self.lines, width=self.container_rect.width,
+                    max_height=self.container_rect.height, size=size, font=self.font)
+        return line_breaks
+
+    def fits(self, size: int) -> bool:
+        return self.get_line_breaks(size).fits
+
+    def estimate_size(self) -> int:
+        # Text width and height are roughly proportional to the font size, so measure the
+        # text at one size and scale that to the area available.
+        (_, line_height) = self.font.get_size("X", ESTIMATE_FONT_SIZE)
+        total_width = 0
+        for words in self.lines:
+            for word in words:
+                (w, h) = self.font.get_size(" " + word, ESTIMATE_FONT_SIZE)
+                total_width += w
+
+        scale = self.container_rect.height / max(1, len(self.lines) * line_height)
+        if total_width > 0:
+            scale = min(scale, ((self.container_rect.width * self.container_rect.height)
+                                / (total_width * line_height)) ** 0.5)
+        return self.clamp_size(ESTIMATE_FONT_SIZE * scale)
+
+    def clamp_size(self, size: float) -> int:
+        return min(MAX_FONT_SIZE, max(MIN_FONT_SIZE, int(size)))
+
+    def get_fitting_size(self) -> int:
+        # Make a better estimate from the height of the text at the first estimate.
+        # The height is proportional to the size, or to the square of the size if the
+        # lines are wrapped.
+        size = self.estimate_size()
+        line_breaks = self.get_line_breaks(size)
+        if line_breaks.height > 0:
+            scale = self.container_rect.height / line_breaks.height
+            if len(line_breaks.row_width) > len(self.lines):
+                scale = scale ** 0.5
+            size = self.clamp_size(size * scale)
+
+        # Search outwards with increasing steps, then binary search between the
+        # last size that fits (low_size) and the first that doesn't (high_size).
+        # If no size fits, MIN_FONT_SIZE is returned, as the text cannot be drawn anyway.
+        step = 1
+        if self.fits(size):
+            low_size = size
+            high_size = MAX_FONT_SIZE + 1
+            while (low_size + step) < high_size:
+                if not self.fits(low_size + step):
+                    high_size = low_size + step
+                    break
+                low_size += step
+                step *= 2
+        else:
+            high_size = size
+            low_size = MIN_FONT_SIZE
+            while (high_size - step) > low_size:
+                if self.fits(high_size - step):
+                    low_size = high_size - step
+                    break
+                high_size -= step
+                step *= 2
+
+        while low_size < (high_size - 1):
+            size = (low_size + high_size) // 2
+            if self.fits(size):
+                low_size = size
+            else:
+                high_size = size
+        return low_size
+
+    def get_word_locations(self, size: int, horizontal_align: int,
+                           vertical_align: int) -> "WordLocations":
+        return WordLocations(text="", container_rect=self.container_rect, size=size,
+                             horizontal_align=horizontal_align, vertical_align=vertical_align,
+                             font=self.font, line_breaks=self.get_line_breaks(size))
+
+class WordLocations:
+    def __init__(self, text: str, container_rect: RectType, size: int,
+                horizontal_align: int, vertical_align: int, font: Font,
+                line_breaks: typing.Optional[LineBreaks] = None) -> None:
+        # Here is the available space for the text
+        self.container_rect = container_rect
+
+        # Plan where the words would be, assuming this size, and align left and align top.
+        if line_breaks is None:
+            line_breaks = LineBreaks(lines=[line.split() for line in text.split("\n")],
+                                     width=self.container_rect.width,
+                                     max_height=self.container_rect.height,
+                                     size=size, font=font)
+        if not line_breaks.fits:
+            raise TooBigError()
+
+        # Here are the locations of the words
+        self.word_loc: typing.List[typing.Tuple[RectType, str]] = [
+                    (Rect(x, y, w, h), word) for (x, y, w, h, word) in line_breaks.word_loc]
+        row_width = line_breaks.row_width
+        max_height = line_breaks.height
 
         # Here is the container for the text - the width spans the whole container
         # because horizontal alignment requires modifying each line separately.
@@ -155,8 +380,16 @@ class WordLocations:
                     r.left += (self.container_rect.width - row_width[r.top])
                 self.word_loc[i] = (r, word)
         
-    def render(self, draw_area: SurfaceType, f: pygame.font.Font, colour: ColourType) -> None:
+    def render_words(self, f: pygame.font.Font,
+                     colour: ColourType) -> typing.List[typing.Tuple[SurfaceType, RectType]]:
+        # Each word is rendered at the left of its location, without the space before it
+        words: typing.List[typing.Tuple[SurfaceType, RectType]] = []
         for (r, word) in self.word_loc:
-            r.left += self.text_rect.left
-            r.top += self.text_rect.top
-            draw_area.blit(f.render(word, True, colour), r.topleft)
+            word_surface = f.render(word, True, colour)
+            words.append((word_surface, word_surface.get_rect(
+                        topleft=(r.left + self.text_rect.left, r.top + self.text_rect.top))))
+        return words
+
+    def render(self, draw_area: SurfaceType, f: pygame.font.Font, colour: ColourType) -> None:
+        for (word_surface, r) in self.render_words(f, colour):
+            draw_area.blit(word_surface, r.topleft)
@@ -3,8 +3,10 @@ import enum
 import sqlite3
 import typing
 import os
+import threading
 import time
 
+from .constants import *
 from .game_types import *
 
 class UpdateEffect(enum.Enum):
@@ -15,6 +17,22 @@ class UpdateEffect(enum.Enum):
     BETTER_TIME = enum.auto()
     OUT_OF_TIME = enum.auto()
 
+# (level_id, score, counter) for GameDatabase.record_attempts
+AttemptType = typing.Tuple[int, typing.Optional[int], typing.Optional[int]]
+
+# Records one attempt (level_id, score, counter, completed, last_played) with one
+# statement. MAX and MIN are NULL if either value is NULL, so a NULL score or
+# counter (a failed attempt) leaves the best values unchanged.
+RECORD_ATTEMPT_SQL = """INSERT INTO score
+        (level_id, last_score, best_counter, played, completed, last_played)
+        VALUES (?1, ?2, ?3, 1, ?4, ?5)
+        ON CONFLICT (level_id) DO UPDATE SET
+            last_score = COALESCE(MAX(last_score, excluded.last_score), last_score, excluded.last_score),
+            best_counter = COALESCE(MIN(best_counter, excluded.best_counter), best_counter, excluded.best_counter),
+            played = played + 1,
+            completed = completed + excluded.completed,
+            last_played = excluded.last_played"""
+
 class PlayInfo:
     def __init__(self,
             last_score: typing.Optional[int],
@@ -36,8 +54,196 @@ class PlayInfo:
 class DatabaseError(Exception):
     pass
 
-class GameDatabase:
+class ScoreRow:
+    # In-memory copy of one row of the score table
+    def __init__(self, level_id: int, play_info: PlayInfo,
+                 last_played: float, seed: typing.Optional[int]) -> None:
+        self.level_id = level_id
+        self.play_info = play_info
+        self.last_played = last_played
+        self.seed = seed
+
+    def get_values(self) -> typing.Tuple[typing.Any, ...]:
+        return (self.level_id, self.play_info.last_score, self.play_info.best_counter,
+                self.play_info.played, self.play_info.completed, self.last_played, self.seed)
+
+class ScoreIndex:
+    # Copy of the score table in memory, updated whenever the table is written.
+    # The sums of last_score and best_counter for levels 1 .. n, and the number of
+    # values in each sum, are kept in Fenwick trees, so they take O(log n) time.
+    def __init__(self, rows: typing.Iterable[ScoreRow]) -> None:
+        self.rows: typing.Dict[int, ScoreRow] = {}
+        self.low_rows: typing.Dict[int, ScoreRow] = {}
+        self.size = SCORE_INDEX_INITIAL_SIZE
+        self.trees: typing.List[typing.List[int]] = [[0] * (self.size + 1) for i in range(NUM_SCORE_SUMS)]
+        self.maximum_level_completed = 0
+        self.most_recent_played: typing.Optional[ScoreRow] = None
+        for row in rows:
+            self.put(row)
+
+    def get(self, level_id: int) -> typing.Optional[ScoreRow]:
+        return self.rows.get(level_id, None)
+
+    def put(self, row: ScoreRow) -> None:
+        old_row = self.rows.get(row.level_id, None)
+        self.rows[row.level_id] = row
+
+        if row.level_id < 1:
+            self.low_rows[row.level_id] = row
+        elif row.level_id > self.size:
+            self.resize(max(self.size * 2, row.level_id))
+        else:
+            old_values = get_score_sum_values(old_row)
+            for (tree, value, old_value) in zip(self.trees, get_score_sum_values(row), old_values):
+                if value != old_value:
+                    add_to_tree(tree, row.level_id, value - old_value)
+
+        # Levels are never uncompleted or unplayed, and last_played only increases,
+        # so a full search is only needed if the table was changed some other way
+        if row.play_info.completed > 0:
+            self.maximum_level_completed = max(self.maximum_level_completed, row.level_id)
+        elif row.level_id == self.maximum_level_completed:
+            self.maximum_level_completed = max([r.level_id for r in self.rows.values()
+                                                if r.play_info.completed > 0], default=0)
+
+        if ((row.play_info.played > 0) and ((self.most_recent_played is None)
+                or (row.last_played >= self.most_recent_played.last_played))):
+            self.most_recent_played = row
+        elif (self.most_recent_played is not None) and (self.most_recent_played.level_id == row.level_id):
+            played = [r for r in self.rows.values() if r.play_info.played > 0]
+            self.most_recent_played = max(played, key=lambda r: r.last_played) if played else None
+
+    def resize(self, size: int) -> None:
+        self.size = size
+        self.trees = [[0] * (self.size + 1) for i in range(NUM_SCORE_SUMS)]
+        for row in self.rows.values():
+            if row.level_id < 1:
+                continue
+            for (tree, value) in zip(self.trees, get_score_sum_values(row)):
+                if value != 0:
+                    add_to_tree(tree, row.level_id, value)
+
+    def get_sums(self, level_id: int) -> typing.List[int]:
+        # Sums of each of the values from get_score_sum_values() for levels up to and including level_id
+        sums = [0] * NUM_SCORE_SUMS
+        for (i, tree) in enumerate(self.trees):
+            j = min(level_id, self.size)
+            while j > 0:
+                sums[i] += tree[j]
+                j -= j & (-j)
+
+        # Levels below 1 are not in the trees
+        for row in self.low_rows.values():
+            if row.level_id <= level_id:
+                for (i, value) in enumerate(get_score_sum_values(row)):
+                    sums[i] += value
+        return sums
+
+def get_score_sum_values(row: typing.Optional[ScoreRow]) -> typing.Tuple[int, int, int, int]:
+    # Values for the sums in ScoreIndex: last_score, number of levels with a
+    # last_score, best_counter, number of levels with a best_counter
+    if row is None:
+        return (0, 0, 0, 0)
+    info = row.play_info
+    return (info.last_score if (info.last_score is not None) else 0,
+            1 if (info.last_score is not None) else 0,
+            info.best_counter if (info.best_counter is not None) else 0,
+            1 if (info.best_counter is not None) else 0)
+
+def add_to_tree(tree: typing.List[int], level_id: int, value: int) -> None:
+    j = level_id
+    while j < len(tree):
+        tree[j] += value
+        j += j & (-j)
+
+class DatabaseWriter:
+    # Writes to the database on a background thread. Each write has a key, and
+    # replaces any write with the same key that is still waiting, e.g. the window
+    # size during a resize. Waiting writes are done together in one transaction.
     def __init__(self, file_name: Path) -> None:
+        self.file_name = file_name
+        self.pending: typing.Dict[typing.Any, typing.Tuple[str, typing.Tuple[typing.Any, ...]]] = {}
+        self.busy = False
+        self.stop = False
+        self.flushing = 0
+        self.error: typing.Optional[Exception] = None
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name="DatabaseWriter", daemon=True)
+        self.thread.start()
+
+    def put(self, key: typing.Any, sql: str, parameters: typing.Tuple[typing.Any, ...]) -> None:
+        with self.condition:
+            self.check_error()
+            self.pending.pop(key, None)
+            self.pending[key] = (sql, parameters)
+            self.condition.notify_all()
+
+    def flush(self) -> None:
+        # Wait until everything has been written
+        with self.condition:
+            self.flushing += 1
+            self.condition.notify_all()
+            try:
+                self.condition.wait_for(lambda: (self.error is not None) or not (self.pending or self.busy))
+            finally:
+                self.flushing -= 1
+            self.check_error()
+
+    def close(self) -> None:
+        with self.condition:
+            self.stop = True
+            self.condition.notify_all()
+        self.thread.join()
+        self.check_error()
+
+    def check_error(self) -> None:
+        if self.error is not None:
+            raise DatabaseError(f"Database write error: {self.file_name}: {self.error}")
+
+    def run(self) -> None:
+        try:
+            db = sqlite3.connect(self.file_name, isolation_level=None)
+        except Exception as e:
+            # Nothing can be written: put(), flush() and close() report the error
+            with self.condition:
+                self.error = e
+                self.condition.notify_all()
+            return
+
+        try:
+            while True:
+                with self.condition:
+                    self.condition.wait_for(lambda: self.stop or bool(self.pending))
+                    if not self.pending:
+                        return
+
+                # Allow a short time for more writes to be batched together
+                with self.condition:
+                    self.condition.wait_for(lambda: self.stop or (self.flushing > 0), timeout=WRITE_BEHIND_DELAY_S)
+                    writes = list(self.pending.values())
+                    self.pending.clear()
+                    self.busy = True
+
+                try:
+                    c = db.cursor()
+                    c.execute("BEGIN TRANSACTION")
+                    try:
+                        for (sql, parameters) in writes:
+                            c.execute(sql, parameters)
+                    finally:
+                        c.execute("COMMIT TRANSACTION")
+                except Exception as e:
+                    with self.condition:
+                        self.error = e
+                finally:
+                    with self.condition:
+                        self.busy = False
+                        self.condition.notify_all()
+        finally:
+            db.close()
+
+class GameDatabase:
+    def __init__(self, file_name: Path, write_behind: bool = False) -> None:
         self.file_name = file_name
         init = not self.file_name.is_file()
         try:
@@ -50,6 +256,52 @@ class GameDatabase:
 
         self.upgrade_database()
 
+        # In write-behind mode, writes are done by a background thread, and reads
+        # come from a copy of the database in memory, so they include the writes
+        # which have not been done yet
+        self.writer: typing.Optional[DatabaseWriter] = None
+        self.window_size = (0, 0)
+        self.score_index = ScoreIndex(self.load_scores())
+
+        # Each attempt has a later last_played than the one before, even within
+        # one call to record_attempts(), so the most recent level is never a tie
+        most_recent_played = self.score_index.most_recent_played
+        self.last_played = most_recent_played.last_played if (most_recent_played is not None) else 0.0
+        if write_behind:
+            self.window_size = self.get_window_size()
+            self.writer = DatabaseWriter(self.file_name)
+
+    def load_scores(self) -> typing.List[ScoreRow]:
+        # Reads of the score table come from a ScoreIndex, so the table is only read here
+        c = self.db.cursor()
+        c.execute("""SELECT level_id, last_score, best_counter, played, completed, last_played, seed FROM score""")
+        scores: typing.List[ScoreRow] = []
+        for f in c.fetchall():
+            scores.append(ScoreRow(level_id=f[0],
+                                   play_info=PlayInfo(last_score=f[1],
+                                                      best_counter=f[2],
+                                                      played=f[3] if (f[3] is not None) else 0,
+                                                      completed=f[4] if (f[4] is not None) else 0),
+                                   last_played=f[5] if (f[5] is not None) else 0.0, seed=f[6]))
+        return scores
+
+    def flush(self) -> None:
+        # Wait until all writes have been done, e.g. before the app is suspended
+        if self.writer is not None:
+            self.writer.flush()
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        self.db.close()
+
+    def write_score_row(self, row: ScoreRow) -> None:
+        assert self.writer is not None
+        self.writer.put(("score", row.level_id), """INSERT OR REPLACE INTO score
+                (level_id, last_score, best_counter, played, completed, last_played, seed)
+                VALUES (?, ?, ?, ?, ?, ?, ?)""", row.get_values())
+
     def init_database(self) -> None:
         # Always create a version 1 schema
         c = self.db.cursor()
@@ -99,6 +351,8 @@ CREATE TABLE score
             self.db.commit()
 
     def get_window_size(self) -> ScreenXY:
+        if self.writer is not None:
+            return self.window_size
         c = self.db.cursor()
         c.execute("""SELECT width, height FROM window_size""")
         f = c.fetchone()
@@ -107,39 +361,44 @@ CREATE TABLE score
         return (int(f[0]), int(f[1]))
 
     def set_window_size(self, wh: ScreenXY) -> None:
+        if self.writer is not None:
+            self.window_size = wh
+            self.writer.put("window_size", """UPDATE window_size SET width = ?, height = ?""", wh)
+            return
         c = self.db.cursor()
         c.execute("""UPDATE window_size SET width = ?, height = ?""", wh)
         self.db.commit()
 
     def get_most_recent_level_played(self) -> int:
-        c = self.db.cursor()
-        c.execute("""SELECT level_id FROM score WHERE played > 0 ORDER BY last_played DESC LIMIT 1""")
-        f = c.fetchone()
-        if f is None:
+        row = self.score_index.most_recent_played
+        if row is None:
             return 1
         else:
-            return f[0]
+            return row.level_id
 
     def get_maximum_level_completed(self) -> int:
-        c = self.db.cursor()
-        c.execute("""SELECT level_id FROM score WHERE completed > 0 ORDER BY level_id DESC LIMIT 1""")
-        f = c.fetchone()
-        if f is None:
-            return 0
-        else:
-            return f[0]
+        return self.score_index.maximum_level_completed
 
     def get_score_and_time_up_to_and_including_level(self, level_id: int) -> typing.Tuple[int, int]:
-        c = self.db.cursor()
-        c.execute("""SELECT SUM(last_score), SUM(best_counter) FROM score WHERE level_id <= ?""",
-                (level_id, ))
-        f = c.fetchone()
-        if (f is None) or (None in f):
+        # Like SUM in SQL, a sum is None if there were no values
+        (score, num_scores, counter, num_counters) = self.score_index.get_sums(level_id)
+        if (num_scores == 0) or (num_counters == 0):
             return (0, 0)
         else:
-            return (f[0], f[1])
+            return (score, counter)
 
     def set_seed_for_level(self, level_id: int, seed: int) -> None:
+        row = self.score_index.get(level_id)
+        if row is None:
+            # Seeds are only stored for levels that have been played
+            return
+
+        row = ScoreRow(level_id, row.play_info, row.last_played, seed)
+        self.score_index.put(row)
+        if self.writer is not None:
+            self.write_score_row(row)
+            return
+
         c = self.db.cursor()
         c.execute("BEGIN TRANSACTION")
         try:
@@ -149,94 +408,98 @@ CREATE TABLE score
             self.db.commit()
 
     def get_seed_for_level(self, level_id: int) -> int:
-        c = self.db.cursor()
-        c.execute("""SELECT seed FROM score WHERE level_id = ?""", (level_id, ))
-        f = c.fetchone()
-        if (f is None) or (None in f):
+        row = self.score_index.get(level_id)
+        if (row is None) or (row.seed is None):
             return 0
         else:
-            return f[0]
+            return row.seed
 
     def get_play_info_for_level(self, level_id: int) -> PlayInfo:
-        return self.__get_play_info_for_level(self.db.cursor(), level_id)
-
-    def __get_play_info_for_level(self, c: sqlite3.Cursor, level_id: int) -> PlayInfo:
-        c.execute("""SELECT last_score, best_counter, played, completed FROM score WHERE level_id = ?""",
-                (level_id, ))
-        f = c.fetchone()
-        if f is None:
+        row = self.score_index.get(level_id)
+        if row is None:
             return PlayInfo(last_score=None, best_counter=None, played=0, completed=0)
-
-        return PlayInfo(last_score=f[0],
-                        best_counter=f[1],
-                        played=f[2] if (f[2] is not None) else 0,
-                        completed=f[3] if (f[3] is not None) else 0)
-
-    def __set_play_info_for_level(self, c: sqlite3.Cursor, level_id: int, new_result: PlayInfo) -> None:
-        # Check table for an existing entry for this level
-        c.execute("""SELECT played FROM score WHERE level_id = ?""", (level_id, ))
-        f = c.fetchone()
-        if (f is None) or (f[0] is None):
-            # No table row for this level_id - create it
-            c.execute("""INSERT INTO score
-                    (level_id, last_played, played, completed)
-                    VALUES (?, 0, 0, 0)""", (level_id, ))
-
-        # Update existing entry
-        c.execute("""UPDATE score SET played = ?, completed = ?, last_played = ?
-                        WHERE level_id = ?""",
-                            (new_result.played, new_result.completed, time.time(), level_id))
-        if new_result.best_counter is not None:
-            c.execute("""UPDATE score SET best_counter = ? WHERE level_id = ?""",
-                                (new_result.best_counter, level_id))
-        if new_result.last_score is not None:
-            c.execute("""UPDATE score SET last_score = ? WHERE level_id = ?""",
-                                (new_result.last_score, level_id))
+        return row.play_info.copy()
 
     def failed_attempt_at_level(self, level_id: int) -> UpdateEffect:
-        c = self.db.cursor()
-        c.execute("BEGIN TRANSACTION")
-        try:
-            previous_result = self.__get_play_info_for_level(c, level_id)
-            new_result = previous_result.copy()
-            new_result.played += 1
-            self.__set_play_info_for_level(c, level_id, new_result)
-            return UpdateEffect.NO_IMPROVEMENT
-        finally:
-            c.execute("COMMIT TRANSACTION")
-            self.db.commit()
+        return self.record_attempts([(level_id, None, None)])[0]
 
     def successful_attempt_at_level(self, level_id: int, score: int, counter: int) -> UpdateEffect:
-        c = self.db.cursor()
-        c.execute("BEGIN TRANSACTION")
-        try:
-            previous_result = self.__get_play_info_for_level(c, level_id)
-            new_result = previous_result.copy()
-            new_result.played += 1
-            new_result.completed += 1
-            better_score = False
-            better_time = False
-
-            if (previous_result.last_score is None) or (score > previous_result.last_score):
-                new_result.last_score = score       # Better score
-                better_score = True
-
-            if (previous_result.best_counter is None) or (counter < previous_result.best_counter):
-                new_result.best_counter = counter   # Better time
-                better_time = True
-
-            self.__set_play_info_for_level(c, level_id, new_result)
-
-            if new_result.completed == 1:
-                return UpdateEffect.COMPLETED_FIRST_TIME
-            elif better_score and better_time:
-                return UpdateEffect.BETTER_TIME_AND_SCORE
-            elif better_time:
-                return UpdateEffect.BETTER_TIME
-            elif better_score:
-                return UpdateEffect.BETTER_SCORE
-            else:
-                return UpdateEffect.NO_IMPROVEMENT
-        finally:
-            c.execute("COMMIT TRANSACTION")
+        return self.record_attempts([(level_id, score, counter)])[0]
+
+    def record_attempts(self, attempts: typing.Iterable[AttemptType]) -> typing.List[UpdateEffect]:
+        # Each attempt is (level_id, score, counter), with score and counter None for a
+        # failed attempt. All of the attempts are written in one transaction, so this
+        # is much faster than one call per attempt, e.g. when importing bot runs.
+        # The score index is only changed once the attempts have been written.
+        last_played = self.last_played
+        effects: typing.List[UpdateEffect] = []
+        rows: typing.Dict[int, ScoreRow] = {}
+        values: typing.List[typing.Tuple[typing.Any, ...]] = []
+        for (level_id, score, counter) in attempts:
+            if (score is None) or (counter is None):
+                (score, counter) = (None, None)
+            last_played = max(time.time(), last_played + LAST_PLAYED_STEP_S)
+
+            old_row = rows.get(level_id, None) or self.score_index.get(level_id)
+            previous_result = (old_row.play_info if (old_row is not None)
+                    else PlayInfo(last_score=None, best_counter=None, played=0, completed=0))
+            (new_result, effect) = get_attempt_result(previous_result, score, counter)
+            rows[level_id] = ScoreRow(level_id, new_result, last_played,
+                                      old_row.seed if (old_row is not None) else None)
+            effects.append(effect)
+            values.append((level_id, score, counter, 0 if (score is None) else 1, last_played))
+
+        if len(values) == 0:
+            return effects
+
+        if self.writer is not None:
+            for row in rows.values():
+                self.write_score_row(row)
+        else:
+            c = self.db.cursor()
+            c.execute("BEGIN TRANSACTION")
+            try:
+                c.executemany(RECORD_ATTEMPT_SQL, values)
+                c.execute("COMMIT TRANSACTION")
+            except Exception:
+                # Nothing is recorded, in the table or in the score index
+                if self.db.in_transaction:
+                    c.execute("ROLLBACK TRANSACTION")
+                raise
             self.db.commit()
+
+        self.last_played = last_played
+        for row in rows.values():
+            self.score_index.put(row)
+        return effects
+
+def get_attempt_result(previous_result: PlayInfo, score: typing.Optional[int],
+                       counter: typing.Optional[int]) -> typing.Tuple[PlayInfo, UpdateEffect]:
+    # The same rules as RECORD_ATTEMPT_SQL, for the in-memory copy of the score table
+    new_result = previous_result.copy()
+    new_result.played += 1
+    if (score is None) or (counter is None):
+        return (new_result, UpdateEffect.NO_IMPROVEMENT)
+
+    new_result.completed += 1
+    better_score = False
+    better_time = False
+
+    if (previous_result.last_score is None) or (score > previous_result.last_score):
+        new_result.last_score = score       # Better score
+        better_score = True
+
+    if (previous_result.best_counter is None) or (counter < previous_result.best_counter):
+        new_result.best_counter = counter   # Better time
+        better_time = True
+
+    if new_result.completed == 1:
+        return (new_result, UpdateEffect.COMPLETED_FIRST_TIME)
+    elif better_score and better_time:
+        return (new_result, UpdateEffect.BETTER_TIME_AND_SCORE)
+    elif better_time:
+        return (new_result, UpdateEffect.BETTER_TIME)
+    elif better_score:
+        return (new_result, UpdateEffect.BETTER_SCORE)
+    else:
+        return (new_result, UpdateEffect.NO_IMPROVEMENT)
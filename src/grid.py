@@ -1,4 +1,5 @@
 
+import array
 import enum
 import typing
 from pygame import Rect
@@ -9,32 +10,20 @@ from .images import Images
 from .game_config import GameConfig
 
 class Cell:
-    def __init__(self, xy: GridXY, num_values: int, value: int) -> None:
-        self.xy = xy
-        self.num_values = num_values
-        self.hidden_value = value
-        self.lock_value = self.hidden_value
-        self.locked = False
-
-    def update(self, add: int) -> None:
-        self.hidden_value = (self.hidden_value + add) % self.num_values
-        if not self.locked:
-            self.lock_value = self.hidden_value
-
-    def toggle(self) -> None:
-        self.locked = not self.locked
+    # A view of one cell: the cell state itself is held in the Grid's arrays
+    def __init__(self, grid: "Grid", index: int) -> None:
+        self.grid = grid
+        self.index = index
+        self.xy = (index % grid.width, index // grid.width)
 
     def get_lock_group(self) -> int:
-        if not self.locked:
-            return -1
-        else:
-            return self.lock_value
+        return self.grid.get_lock_group_at(self.index)
 
     def get_value(self) -> int:
-        return self.lock_value
+        return self.grid.lock_values[self.index]
 
     def is_locked(self) -> bool:
-        return self.locked
+        return bool(self.grid.locked[self.index])
 
 class ClickEffect(enum.Enum):
     OUTSIDE_GAME = enum.auto()
@@ -46,72 +35,86 @@ class ClickEffect(enum.Enum):
 class Grid:
     def __init__(self, rng: DeterministicRandom, game_config: GameConfig) -> None:
         self.game_config = game_config
+        self.width = self.game_config.width
+        self.height = self.game_config.height
+        self.num_values = self.game_config.num_values
+        self.size = self.width * self.height
+
+        # Cell state is held in flat arrays, indexed by (y * width) + x
+        self.hidden_values = array.array("b", rng.randrange_many(0, self.num_values, self.size))
+        self.lock_values = array.array("b", self.hidden_values)
+        self.locked = array.array("b", bytes(self.size))
+
+        # Number of locked cells in each lock group, and the lock groups
+        # having each possible size, so that the largest group is always known
+        self.lock_group_sizes: typing.List[int] = [0] * self.num_values
+        self.lock_groups_by_size: typing.List[typing.Set[int]] = [set() for i in range(self.size + 1)]
+        self.lock_groups_by_size[0].update(range(self.num_values))
+        self.largest_lock_group_size = 0
 
-        self.cells: typing.Dict[GridXY, Cell] = {}
-        for y in range(self.game_config.height):
-            for x in range(self.game_config.width):
-                self.cells[(x, y)] = Cell(
-                    xy=(x, y),
-                    num_values=self.game_config.num_values,
-                    value=rng.randrange(0, self.game_config.num_values))
+        self.periodic_counter = 0
 
-        self.lock_groups: typing.Dict[int, typing.Set[Cell]] = {}
-        for lock_group in range(-1, self.game_config.num_values):
-            self.lock_groups[lock_group] = set()
-        for cell in self.cells.values():
-            self.lock_groups[cell.get_lock_group()].add(cell)
+    def get_index(self, xy: GridXY) -> int:
+        (x, y) = xy
+        if (0 <= x < self.width) and (0 <= y < self.height):
+            return (y * self.width) + x
+        return -1
 
-        self.periodic_counter = 0
+    def get_lock_group_at(self, index: int) -> int:
+        if not self.locked[index]:
+            return -1
+        else:
+            return self.lock_values[index]
 
-    def is_complete(self) -> bool:
-        size = self.game_config.width * self.game_config.height
-        for lock_group in range(0, self.game_config.num_values):
-            if len(self.lock_groups[lock_group]) == size:
-                return True
+    def resize_lock_group(self, lock_group: int, add: int) -> None:
+        old_size = self.lock_group_sizes[lock_group]
+        new_size = old_size + add
+        self.lock_group_sizes[lock_group] = new_size
+        self.lock_groups_by_size[old_size].remove(lock_group)
+        self.lock_groups_by_size[new_size].add(lock_group)
+
+        if new_size > self.largest_lock_group_size:
+            self.largest_lock_group_size = new_size
+        elif len(self.lock_groups_by_size[self.largest_lock_group_size]) == 0:
+            # The largest group shrank by one, so now the largest size is its new size
+            self.largest_lock_group_size = new_size
 
-        return False
+    def is_complete(self) -> bool:
+        return self.largest_lock_group_size == self.size
 
     def get_cell(self, xy: GridXY) -> typing.Optional[Cell]:
-        return self.cells.get(xy, None)
+        index = self.get_index(xy)
+        if index < 0:
+            return None
+        return Cell(self, index)
 
     def get_largest_lock_group(self) -> typing.Optional[int]:
-        largest_group_size = 0
-        for lock_group in range(0, self.game_config.num_values):
-            largest_group_size = max(largest_group_size, len(self.lock_groups[lock_group]))
-        largest_group_count = 0
-        largest_lock_group = -1
-        for lock_group in range(0, self.game_config.num_values):
-            if largest_group_size == len(self.lock_groups[lock_group]):
-                largest_group_count += 1
-                largest_lock_group = lock_group
-
-        if largest_group_count != 1:
+        largest_lock_groups = self.lock_groups_by_size[self.largest_lock_group_size]
+        if len(largest_lock_groups) != 1:
             # There is no single largest group
             return None
         else:
+            (largest_lock_group, ) = largest_lock_groups
             return largest_lock_group
 
     def toggle(self, xy: GridXY) -> ClickEffect:
-        cell = self.cells.get(xy, None)
-        if cell is None:
+        index = self.get_index(xy)
+        if index < 0:
             return ClickEffect.OUTSIDE_GAME
 
-        # Remove from old lock group
-        old_lock_group = cell.get_lock_group()
-        self.lock_groups[old_lock_group].remove(cell)
+        if self.locked[index]:
+            # Remove from old lock group
+            self.locked[index] = 0
+            self.resize_lock_group(self.lock_values[index], -1)
+            return ClickEffect.UNLOCK
 
         # Assess the size of the lock groups, ignoring the affected cell
         largest_lock_group = self.get_largest_lock_group()
 
-        # Apply the change
-        cell.toggle()
-
         # Add to new lock group
-        new_lock_group = cell.get_lock_group()
-        self.lock_groups[new_lock_group].add(cell)
-
-        if new_lock_group < 0:
-            return ClickEffect.UNLOCK
+        self.locked[index] = 1
+        new_lock_group = self.lock_values[index]
+        self.resize_lock_group(new_lock_group, 1)
 
         # Now a cell became locked - how does this affect the score?
         if largest_lock_group is None:
@@ -125,9 +128,31 @@ class Grid:
             return ClickEffect.LOCK_BAD
 
     def update(self, xy: GridXY, add: int) -> None:
-        cell = self.cells.get(xy, None)
-        if cell is not None:
-            cell.update(add)
+        index = self.get_index(xy)
+        if index >= 0:
+            self.update_indexes((index, ), add)
+
+    def update_many(self, xys: typing.Iterable[GridXY], add: int) -> None:
+        self.update_indexes([(y * self.width) + x for (x, y) in xys], add)
+
+    def update_row(self, y: int, add: int) -> None:
+        start = y * self.width
+        self.update_indexes(range(start, start + self.width), add)
+
+    def update_column(self, x: int, add: int) -> None:
+        self.update_indexes(range(x, self.size, self.width), add)
+
+    def update_indexes(self, indexes: typing.Iterable[int], add: int) -> None:
+        # Bulk update: the hidden value always changes, the visible value only if unlocked
+        num_values = self.num_values
+        hidden_values = self.hidden_values
+        lock_values = self.lock_values
+        locked = self.locked
+        for index in indexes:
+            value = (hidden_values[index] + add) % num_values
+            hidden_values[index] = value
+            if not locked[index]:
+                lock_values[index] = value
 
     def get_cell_size(self, game_rect: RectType) -> int:
         return max(1, min(game_rect.width // self.game_config.width,
@@ -9,6 +9,9 @@ from .game_types import *
 from .deterministic_random import DeterministicRandom
 from .colour import Colour
 from .game_config import GameConfig
+from .asset_pack import AssetPack
+from .display_format import display_format
+from .lru_cache import LRUCache, get_surface_bytes
 
 
 
@@ -21,10 +24,28 @@ class LockType(enum.Enum):
     LOCK_BAD = enum.auto()
 
 class Images:
-    def __init__(self, img_dir_path: Path) -> None:
+    def __init__(self, img_dir_path: Path, pack_path: typing.Optional[Path] = None,
+                 tile_cache_bytes: int = MAX_TILE_CACHE_BYTES,
+                 scaled_image_cache_bytes: int = MAX_SCALED_IMAGE_BYTES) -> None:
+        # Decoded images may be loaded from an asset pack, which is much faster
+        all_image_paths = get_all_images(img_dir_path)
+        lock_image_path = img_dir_path / "bone.png"
+        bad_lock_image_path = img_dir_path / "badbone.png"
+        # The surfaces of images loaded from the pack refer to its memory-mapped file
+        self.asset_pack: typing.Optional[AssetPack] = None
+        if pack_path is not None:
+            self.asset_pack = AssetPack(pack_path, img_dir_path,
+                                        all_image_paths + [lock_image_path, bad_lock_image_path],
+                                        load_square_image)
+
+        pack = self.asset_pack
+
+        def make_image(path: Path) -> Image:
+            return Image(path, pack.get_surface(path) if (pack is not None) else None)
+
         self.all_images: typing.List[Image] = []
-        for file_name in get_all_images(img_dir_path):
-            self.all_images.append(Image(file_name))
+        for file_name in all_image_paths:
+            self.all_images.append(make_image(file_name))
 
         if len(self.all_images) < MAX_NUM_VALUES:
             raise NotEnoughImageFilesError(
@@ -32,16 +53,29 @@ class Images:
 
         self.value_images: typing.List[Image] = []
         self.backgrounds: typing.List[Background] = []
-        self.lock_image = Image(img_dir_path / "bone.png")
-        self.bad_lock_image = Image(img_dir_path / "badbone.png")
-        self.icon_path = img_dir_path / "storm.png"
+        self.background_cache: LRUCache[typing.Any, Background] = LRUCache(MAX_BACKGROUND_CACHE_SIZE)
+        self.lock_image = make_image(lock_image_path)
+        self.bad_lock_image = make_image(bad_lock_image_path)
+        self.img_dir_path = img_dir_path
         self.game_config = GameConfig(1, 0)
 
+        # Composed tiles
+        self.tile_cache: LRUCache[typing.Any, SurfaceType] = LRUCache(tile_cache_bytes, get_surface_bytes)
+        self.tile_cache_game_area_size = (0, 0)
+        self.tile_cache_display_format_generation = display_format.generation
+        scaled_image_cache.set_max_size(scaled_image_cache_bytes)
+
+    def get_cache_stats(self) -> typing.Dict[str, typing.Dict[str, int]]:
+        return {"Images.tile_cache": self.tile_cache.get_stats(),
+                "Images.background_cache": self.background_cache.get_stats(),
+                "scaled_image_cache": scaled_image_cache.cache.get_stats()}
+
     def get_icon(self) -> SurfaceType:
-        return pygame.image.load(self.icon_path)
+        return get_icon(self.img_dir_path)
 
     def prepare(self, game_config: GameConfig) -> None:
         self.game_config = game_config
+        self.tile_cache.clear()
         assert self.game_config.num_values <= MAX_NUM_VALUES
         rng = DeterministicRandom(self.game_config.level_id, self.game_config.seed)
 
@@ -57,27 +91,59 @@ class Images:
             colour = Colour((val & 2) * 127, (val & 4) * 63, (val & 1) * 255).brighten(200)
             x = rng.randrange(0, self.game_config.width)
             y = rng.randrange(0, self.game_config.height)
-            self.backgrounds.append(Background(colour, (x, y), (self.game_config.width, self.game_config.height)))
+            self.backgrounds.append(self.get_background(colour, (x, y),
+                                    (self.game_config.width, self.game_config.height)))
+
+    def get_background(self, colour: Colour, cxy: GridXY, wh: GridXY) -> "Background":
+        # Backgrounds are reused between levels
+        key = (colour.get_rgb(), cxy, wh)
+        background = self.background_cache.get(key)
+        if background is None:
+            background = Background(colour, cxy, wh)
+            self.background_cache.put(key, background)
+        return background
 
     def draw(self, value: int,
              game_area: SurfaceType, cell_rect: RectType,
              lock_type: LockType = LockType.UNLOCK, brightness: int = 0) -> None:
 
+        # Tiles are composed once and then reused. The background depends on the
+        # position of the cell within the game area, so that is part of the key.
+        game_area_size = game_area.get_size()
+        if ((game_area_size != self.tile_cache_game_area_size)
+        or (display_format.generation != self.tile_cache_display_format_generation)):
+            self.tile_cache.clear()
+            self.tile_cache_game_area_size = game_area_size
+            self.tile_cache_display_format_generation = display_format.generation
+
+        brightness -= brightness % BRIGHTNESS_STEP
+        key = (value, cell_rect.topleft, cell_rect.size, lock_type, brightness)
+        tile = self.tile_cache.get(key)
+        if tile is None:
+            tile = self.make_tile(value, game_area_size, cell_rect, lock_type, brightness)
+            self.tile_cache.put(key, tile)
+
+        game_area.blit(tile, cell_rect)
+
+    def make_tile(self, value: int, game_area_size: ScreenXY, cell_rect: RectType,
+                  lock_type: LockType, brightness: int) -> SurfaceType:
+        tile = display_format.convert(pygame.Surface(cell_rect.size))
+
         # Draw part of background
-        self.backgrounds[value].draw(game_area, cell_rect)
+        self.backgrounds[value].draw_part(tile, game_area_size, cell_rect)
 
         # Draw highlighting
-        pygame.draw.rect(game_area, (brightness, brightness, 0),
-                         cell_rect, max(1, cell_rect.width // 40))
+        pygame.draw.rect(tile, (brightness, brightness, 0),
+                         tile.get_rect(), max(1, cell_rect.width // 40))
         # Draw cell
-        cell_area = game_area.subsurface(cell_rect)
-        self.value_images[value].draw(cell_area)
+        self.value_images[value].draw(tile)
 
         # Draw lock icon
         if lock_type == LockType.LOCK_GOOD:
-            self.lock_image.draw(cell_area)
+            self.lock_image.draw(tile)
         elif lock_type == LockType.LOCK_BAD:
-            self.bad_lock_image.draw(cell_area)
+            self.bad_lock_image.draw(tile)
+        return tile
 
     def get_num_values(self) -> int:
         return self.game_config.num_values
@@ -85,46 +151,97 @@ class Images:
 class Background:
     def __init__(self, colour: Colour, cxy: GridXY, wh: GridXY) -> None:
         self.colour = colour
-        self.scale_from: SurfaceType = pygame.Surface(wh)
         (w, h) = wh
         (cx, cy) = cxy
         size = max(w, h)
+
+        # The colour of each pixel is darkened according to the distance from (cx, cy).
+        # Generate all of the pixels at once rather than using set_at for each one.
+        (r, g, b) = self.colour.get_rgb()
+        pixels = bytearray()
         for y in range(h):
             for x in range(w):
-                distance = abs(x - cx) + abs(y - cy)
-                self.scale_from.set_at((x, y), self.colour.darken((distance * 200) // size).get_rgb())
+                darkness = ((abs(x - cx) + abs(y - cy)) * 200) // size
+                pixels += bytes((max(0, r - darkness), max(0, g - darkness), max(0, b - darkness)))
 
-        self.resized = self.scale_from.copy()
+        self.scale_from: SurfaceType = pygame.Surface(wh)
+        self.scale_from.blit(pygame.image.frombuffer(bytes(pixels), wh, "RGB"), (0, 0))
 
-    def draw(self, game_area: SurfaceType, cell_rect: RectType, special_flags: int = 0) -> None:
-        size = game_area.get_rect().size
-        if size != self.resized.get_rect().size:
-            self.resized = pygame.transform.smoothscale(self.scale_from, size)
+    def get_resized(self, size: ScreenXY) -> SurfaceType:
+        return scaled_image_cache.get_scaled(self.scale_from, size)
 
-        game_area.blit(source=self.resized,
+    def draw(self, game_area: SurfaceType, cell_rect: RectType, special_flags: int = 0) -> None:
+        game_area.blit(source=self.get_resized(game_area.get_rect().size),
                        dest=cell_rect,
                        area=cell_rect,
                        special_flags=special_flags)
 
+    def draw_part(self, target: SurfaceType, game_area_size: ScreenXY,
+                  cell_rect: RectType, special_flags: int = 0) -> None:
+        # Draw the part of the background at cell_rect into target
+        target.blit(source=self.get_resized(game_area_size),
+                    dest=(0, 0),
+                    area=cell_rect,
+                    special_flags=special_flags)
+
 class Image:
-    def __init__(self, path: Path) -> None:
+    def __init__(self, path: Path, scale_from: typing.Optional[SurfaceType] = None) -> None:
         self.path = path
-
-        original = pygame.image.load(str(path))
-        original_rect = original.get_rect()
-
-        size = max(original_rect.width, original_rect.height)
-        original_rect.center = (size // 2, size // 2)
-
         self.scale_from: SurfaceType 
-        self.scale_from = pygame.Surface((size, size), flags=pygame.SRCALPHA)
-        self.scale_from.blit(original, original_rect.topleft)
-        self.resized: SurfaceType = self.scale_from.copy()
+        if scale_from is None:
+            self.scale_from = load_square_image(path)
+        else:
+            self.scale_from = scale_from
+
+    def get_resized(self, size: ScreenXY) -> SurfaceType:
+        return scaled_image_cache.get_scaled(self.scale_from, size)
 
     def draw(self, target: SurfaceType, special_flags: int = 0) -> None:
-        if self.resized.get_rect().size != target.get_rect().size:
-            self.resized = pygame.transform.smoothscale(self.scale_from, target.get_rect().size)
-        target.blit(self.resized, (0, 0), special_flags=special_flags)
+        target.blit(self.get_resized(target.get_rect().size), (0, 0), special_flags=special_flags)
+
+class ScaledImageCache:
+    # Scaled versions of Image and Background surfaces.
+    # All of them share this cache, so there is one memory budget for scaled images.
+    def __init__(self, max_bytes: int) -> None:
+        self.cache: LRUCache[typing.Tuple[SurfaceType, ScreenXY], SurfaceType]
+        self.cache = LRUCache(max_bytes, get_surface_bytes)
+        self.display_format_generation = display_format.generation
+
+    def set_max_size(self, max_bytes: int) -> None:
+        self.cache.set_max_size(max_bytes)
+
+    def get_scaled(self, source: SurfaceType, size: ScreenXY) -> SurfaceType:
+        # Scaled surfaces are in the display format, so they must be remade if it changes
+        if self.display_format_generation != display_format.generation:
+            self.cache.clear()
+            self.display_format_generation = display_format.generation
+
+        key = (source, size)
+        scaled = self.cache.get(key)
+        if scaled is None:
+            if source.get_rect().size == size:
+                scaled = display_format.convert(source)
+            else:
+                scaled = display_format.convert(pygame.transform.smoothscale(source, size))
+            self.cache.put(key, scaled)
+        return scaled
+
+scaled_image_cache = ScaledImageCache(MAX_SCALED_IMAGE_BYTES)
+
+def get_icon(img_dir_path: Path) -> SurfaceType:
+    return pygame.image.load(img_dir_path / "storm.png")
+
+def load_square_image(path: Path) -> SurfaceType:
+    # Load an image, padding it to make it square
+    original = pygame.image.load(str(path))
+    original_rect = original.get_rect()
+
+    size = max(original_rect.width, original_rect.height)
+    original_rect.center = (size // 2, size // 2)
+
+    square = pygame.Surface((size, size), flags=pygame.SRCALPHA)
+    square.blit(original, original_rect.topleft)
+    return square
 
 def get_all_images(img_dir_path: Path) -> typing.List[Path]:
     file_names: typing.List[Path] = []
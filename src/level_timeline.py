@@ -0,0 +1,82 @@
+import bisect
+import typing
+
+from .constants import *
+from .game_types import *
+from .director import Director
+from .game_config import GameConfig
+
+class LevelTimeline:
+    # The hidden value of each cell depends only on the level and seed, never on
+    # the player's moves, so the whole sequence of changes can be worked out in
+    # advance. Frame t means the state after t calls to Director.update().
+    def __init__(self, game_config: GameConfig) -> None:
+        self.game_config = game_config
+        self.width = self.game_config.width
+        self.height = self.game_config.height
+        self.num_values = self.game_config.num_values
+
+        # The Director is only used to generate the same patterns as a real game
+        self.director = Director(self.game_config)
+        self.initial_values = list(self.director.grid.hidden_values)
+        self.change_frames: typing.List[typing.List[int]] = [[] for i in range(self.director.grid.size)]
+
+        # Frame on which the Director will add its next pattern
+        self.next_start_frame = PLAN_PERIOD_FRAMES - self.director.plan_sequence
+
+    def extend_to(self, frame: int) -> None:
+        # Generate patterns until all of the changes up to and including frame are known
+        while (self.next_start_frame + PLAN_LEADIN_FRAMES) <= frame:
+            pattern = self.director.make_pattern()
+            change_frame = self.next_start_frame + PLAN_LEADIN_FRAMES
+            for time in pattern.schedule.times:
+                for index in pattern.schedule.indexes[time]:
+                    bisect.insort(self.change_frames[index], change_frame + time)
+            self.next_start_frame += PLAN_PERIOD_FRAMES
+
+    def get_index(self, xy: GridXY) -> int:
+        (x, y) = xy
+        assert (0 <= x < self.width) and (0 <= y < self.height)
+        return (y * self.width) + x
+
+    def get_value(self, xy: GridXY, frame: int) -> int:
+        # Hidden value of xy at the given frame
+        self.extend_to(frame)
+        index = self.get_index(xy)
+        num_changes = bisect.bisect_right(self.change_frames[index], frame)
+        return (self.initial_values[index] + num_changes) % self.num_values
+
+    def get_values(self, frame: int) -> typing.List[int]:
+        # Hidden values of all cells at the given frame, indexed by (y * width) + x
+        self.extend_to(frame)
+        return [(self.initial_values[index]
+                    + bisect.bisect_right(self.change_frames[index], frame)) % self.num_values
+                for index in range(len(self.initial_values))]
+
+    def get_next_frame_with_value(self, xy: GridXY, value: int, frame: int) -> int:
+        # First frame, at or after the given frame, when xy has the given value
+        assert 0 <= value < self.num_values
+        current_value = self.get_value(xy, frame)
+        if current_value == value:
+            return frame
+
+        index = self.get_index(xy)
+        change_frames = self.change_frames[index]
+        i = bisect.bisect_right(change_frames, frame)
+        for attempt in range(RUNAWAY_LIMIT):
+            # Later patterns may still add an earlier change, so the next change is only
+            # certain once it is before the next pattern's first change. Every pattern
+            # changes every cell, so this will not take long.
+            while (i >= len(change_frames)) or (change_frames[i] >= (self.next_start_frame + PLAN_LEADIN_FRAMES)):
+                self.extend_to(self.next_start_frame + PLAN_LEADIN_FRAMES)
+
+            # Two patterns may change the same cell on the same frame
+            change_frame = change_frames[i]
+            while (i < len(change_frames)) and (change_frames[i] == change_frame):
+                current_value = (current_value + 1) % self.num_values
+                i += 1
+
+            if current_value == value:
+                return change_frame
+
+        assert False, "Value was never reached"
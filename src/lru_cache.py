@@ -0,0 +1,65 @@
+import collections
+import typing
+
+from .game_types import *
+
+K = typing.TypeVar("K")
+V = typing.TypeVar("V")
+
+class LRUCache(typing.Generic[K, V]):
+    # When the total size of the entries is more than max_size, the least recently
+    # used entries are discarded. The size of each entry is found by get_size, e.g.
+    # the number of bytes in a surface. By default each entry has size 1, so
+    # max_size is the number of entries.
+    def __init__(self, max_size: int,
+                 get_size: typing.Optional[typing.Callable[[V], int]] = None) -> None:
+        self.max_size = max_size
+        self.get_size = get_size
+        self.entries: "collections.OrderedDict[K, typing.Tuple[V, int]]" = collections.OrderedDict()
+        self.total_size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: K) -> typing.Optional[V]:
+        entry = self.entries.get(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key: K, value: V) -> None:
+        old_entry = self.entries.pop(key, None)
+        if old_entry is not None:
+            self.total_size -= old_entry[1]
+        size = self.get_size(value) if (self.get_size is not None) else 1
+        self.entries[key] = (value, size)
+        self.total_size += size
+        self.evict()
+
+    def set_max_size(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.evict()
+
+    def evict(self) -> None:
+        # The most recent entry is kept even if it is bigger than max_size
+        while (self.total_size > self.max_size) and (len(self.entries) > 1):
+            (_, (_, size)) = self.entries.popitem(last=False)
+            self.total_size -= size
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.total_size = 0
+
+    def get_stats(self) -> typing.Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": len(self.entries), "size": self.total_size}
+
+def get_surface_bytes(surface: SurfaceType) -> int:
+    return surface.get_pitch() * surface.get_height()
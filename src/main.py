@@ -2,16 +2,20 @@ import typing
 import pygame
 import os
 import argparse
+import concurrent.futures
 import sys
+import time
 from pathlib import Path
 
 from .constants import *
 from .game_types import *
-from .images import Images
+from .images import Images, get_icon
+from .display_format import display_format
 from .font import Font
 from .game_database import GameDatabase
 from .state import TitleState, BaseState
-from .test_speedrun import test_speedrun
+from .benchmark import benchmark
+from .test_speedrun import test_speedrun, parse_int_list
 from .variant import Variant
 
 
@@ -23,20 +27,62 @@ def pyinstaller_main(variant: str) -> int:
 
 def python_main(argv: typing.List[str]) -> int:
     parser = argparse.ArgumentParser(prog='Bone Storm', description='Game')
-    parser.add_argument("--test-speedrun", type=int, metavar="frames_per_move")
+    parser.add_argument("--test-speedrun", type=str, metavar="frames_per_move",
+                        help="run the speedrun test, e.g. '5' or '2-6,10'")
+    parser.add_argument("--levels", type=str, metavar="level_ids", default="1-100",
+                        help="levels for --test-speedrun, e.g. '1-100'")
+    parser.add_argument("--seeds", type=str, metavar="seeds", default="0",
+                        help="seeds for --test-speedrun, e.g. '0,1,2'")
+    parser.add_argument("--jobs", type=int, metavar="count",
+                        help="number of worker processes for --test-speedrun")
+    parser.add_argument("--output", type=str, metavar="filename",
+                        help="write --test-speedrun results to a .json or .csv file")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="run the benchmarks and compare with the baseline")
+    parser.add_argument("--benchmark-baseline", type=str, metavar="filename",
+                        help="baseline for --benchmark (default benchmark_baseline.json); "
+                             "nothing is compared until --benchmark-save has written one")
+    parser.add_argument("--benchmark-save", type=str, metavar="filename",
+                        help="write --benchmark results, e.g. as a new baseline")
     parser.add_argument("--database", type=str, metavar="filename")
     parser.add_argument("--upgrade-database", action="store_true")
     parser.add_argument("--variant", type=str, metavar="filename")
+    parser.add_argument("--startup-trace", action="store_true",
+                        help="print the time taken by each phase of startup")
     args = parser.parse_args(argv)
 
     if args.test_speedrun:
-        return test_speedrun(int(args.test_speedrun))
+        return test_speedrun(frames_per_move_list=parse_int_list(args.test_speedrun),
+                             level_ids=parse_int_list(args.levels),
+                             seeds=parse_int_list(args.seeds),
+                             num_workers=args.jobs,
+                             output_path=Path(args.output) if args.output else None)
 
     root_path = Path(__file__).parent.parent.absolute()
+    if args.benchmark:
+        return benchmark(root_path=root_path,
+                         baseline_path=(Path(args.benchmark_baseline) if args.benchmark_baseline
+                                        else root_path / "benchmark_baseline.json"),
+                         save_path=Path(args.benchmark_save) if args.benchmark_save else None)
+
     return common_main(root_path,
             database_path=Path(args.database) if args.database else None,
             upgrade_database_only=bool(args.upgrade_database),
-            variant_path=Path(args.variant) if args.variant else None)
+            variant_path=Path(args.variant) if args.variant else None,
+            startup_trace=StartupTrace(bool(args.startup_trace)))
+
+class StartupTrace:
+    def __init__(self, enabled: bool) -> None:
+        self.enabled = enabled
+        self.start = self.last = time.perf_counter()
+
+    def phase(self, name: str) -> None:
+        # Print the time taken since the previous phase
+        now = time.perf_counter()
+        if self.enabled:
+            print(f"Startup: {name} took {(now - self.last) * 1000.0:.1f} ms, "
+                  f"total {(now - self.start) * 1000.0:.1f} ms", flush=True)
+        self.last = now
 
 def is_android() -> bool:
     return hasattr(sys, 'getandroidapilevel')
@@ -44,10 +90,16 @@ def is_android() -> bool:
 def common_main(root_path: Path,
                 database_path: typing.Optional[Path] = None,
                 upgrade_database_only: bool = False,
-                variant_path: typing.Optional[Path] = None) -> int:
+                variant_path: typing.Optional[Path] = None,
+                startup_trace: typing.Optional[StartupTrace] = None) -> int:
+
+    if startup_trace is None:
+        startup_trace = StartupTrace(False)
 
-    pygame.init()
+    # Only the display and font modules are used
+    pygame.display.init()
     pygame.font.init()
+    startup_trace.phase("pygame init")
 
     if not database_path:
         database_dir_path = root_path
@@ -68,9 +120,11 @@ def common_main(root_path: Path,
 
         database_path = database_dir_path / ".bonestorm"
 
-    game_database = GameDatabase(database_path)
+    game_database = GameDatabase(database_path, write_behind=not upgrade_database_only)
+    startup_trace.phase("database")
 
     if upgrade_database_only:
+        game_database.close()
         return 0
 
     if not variant_path:
@@ -79,24 +133,44 @@ def common_main(root_path: Path,
         else:
             variant_path = root_path / "variants" / "desktop.json"
 
-    images = Images(root_path / "img")
-    font = Font(root_path / "font")
     variant = Variant(variant_path)
+    font = Font(root_path / "font",
+                draw_cache_bytes=variant.constants.TEXT_CACHE_MEGABYTES * MEGABYTE)
 
     clock = pygame.time.Clock()
     pygame.display.set_caption("Bone Storm")
-    pygame.display.set_icon(images.get_icon())
-
+    pygame.display.set_icon(get_icon(root_path / "img"))
+    startup_trace.phase("variant and icon")
+
+    # Images are not needed by the title screen, so they are loaded in the background
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    images_future = executor.submit(Images, root_path / "img",
+                                    pack_path=database_path.parent / ".bonestorm-images",
+                                    tile_cache_bytes=variant.constants.TILE_CACHE_MEGABYTES * MEGABYTE,
+                                    scaled_image_cache_bytes=variant.constants.SCALED_IMAGE_CACHE_MEGABYTES * MEGABYTE)
     try:
-        return main_loop(clock=clock, images=images, font=font,
-                         variant=variant, game_database=game_database)
+        return main_loop(clock=clock, images=images_future, font=font,
+                         variant=variant, game_database=game_database,
+                         startup_trace=startup_trace)
     finally:
+        executor.shutdown()
+        game_database.close()
         pygame.quit()
 
 def main_loop(clock: pygame.time.Clock,
-                images: Images, font: Font,
+                images: typing.Union[Images, "concurrent.futures.Future[Images]"],
+                font: Font,
                 variant: Variant,
-                game_database: GameDatabase) -> int:
+                game_database: GameDatabase,
+                startup_trace: typing.Optional[StartupTrace] = None) -> int:
+
+    # Images may still be loading; they are None until they are ready
+    images_future: typing.Optional["concurrent.futures.Future[Images]"] = None
+    loaded_images: typing.Optional[Images] = None
+    if isinstance(images, Images):
+        loaded_images = images
+    else:
+        images_future = images
 
     # Launch the game
     has_input_focus = False
@@ -109,11 +183,18 @@ def main_loop(clock: pygame.time.Clock,
         size = game_database.get_window_size()
         flags = pygame.RESIZABLE
     screen_area = pygame.display.set_mode(size=size, flags=flags)
+    display_format.update()
     screen_area.fill(variant.palette.WINDOW_BG)
     run_time = 0
+    first_frame = True
+    waited = False
 
     while not state.quit_flag:
         run_time += clock.tick(FRAME_RATE_HZ)
+        if waited:
+            # Time spent waiting for events is not skipped
+            run_time = 0
+            waited = False
 
         if has_input_focus:
             # When running, advance by at least one frame
@@ -129,20 +210,45 @@ def main_loop(clock: pygame.time.Clock,
             # When paused, don't track frame skipping
             run_time = 0
 
-        if ((screen_area.get_rect().height < 100)
+        dirty_rects: typing.Optional[typing.List[RectType]] = []
+        if not state.needs_redraw(mouse_pos):
+            # Nothing has changed
+            pass
+        elif ((screen_area.get_rect().height < 100)
         or (screen_area.get_rect().width < 100)):
             # Screen is too small
             screen_area.fill(variant.palette.WINDOW_BG)
+            dirty_rects = None
+            state.invalidate()
         else:
-            state.draw(screen_area, mouse_pos, images, font)
-
-        pygame.display.flip()
-
-        # Process events
-        if has_input_focus:
+            if (images_future is not None) and (state.uses_images or images_future.done()):
+                # Wait for images to be loaded, if they are not ready yet
+                loaded_images = images_future.result()
+                images_future = None
+                if startup_trace is not None:
+                    startup_trace.phase("images")
+            dirty_rects = state.draw(screen_area, mouse_pos, loaded_images, font)
+
+        if dirty_rects is None:
+            pygame.display.flip()
+        elif len(dirty_rects) != 0:
+            pygame.display.update(dirty_rects)
+
+        if first_frame:
+            first_frame = False
+            if startup_trace is not None:
+                startup_trace.phase("first frame")
+
+        # Process events. If the state doesn't need to be drawn again, wait for an event
+        # rather than drawing the same thing on every frame.
+        if has_input_focus and state.needs_redraw(mouse_pos):
             e = pygame.event.poll()
+        elif has_input_focus:
+            e = pygame.event.wait(IDLE_WAIT_TIMEOUT_MS)
+            waited = True
         else:
             e = pygame.event.wait()
+            waited = True
 
         while e.type != pygame.NOEVENT:
             if e.type == pygame.QUIT:
@@ -150,10 +256,22 @@ def main_loop(clock: pygame.time.Clock,
 
             elif e.type == pygame.VIDEORESIZE:
                 game_database.set_window_size(screen_area.get_rect().size)
+                display_format.update()
+                state.invalidate()
+
+            elif e.type == pygame.VIDEOEXPOSE:
+                display_format.update()
+                state.invalidate()
 
             elif e.type == pygame.ACTIVEEVENT:
                 if e.state == pygame.APPINPUTFOCUS:
                     has_input_focus = (e.gain != 0)
+                    if not has_input_focus:
+                        # The app may be stopped without warning, so save everything now
+                        game_database.flush()
+                # The display surface may have been recreated, e.g. on Android
+                display_format.update()
+                state.invalidate()
 
             elif e.type == pygame.MOUSEBUTTONDOWN:
                 state = state.click(e.pos)
@@ -1,4 +1,6 @@
 
+import array
+import bisect
 import collections
 import typing
 
@@ -8,59 +10,135 @@ from .deterministic_random import DeterministicRandom
 from .grid import Grid
 from .game_config import GameConfig
 
+PlanType = typing.Dict[int, typing.List[GridXY]]
 
-class BasePattern:
-    def __init__(self) -> None:
-        self.plan: typing.Dict[int, typing.List[GridXY]] = collections.defaultdict(lambda: [])
-        self.sequence = 0
+class Schedule:
+    # A compiled plan. Schedules are shared between patterns with the same geometry,
+    # so they must not be modified after construction.
+    def __init__(self, plan: PlanType, width: int) -> None:
+        self.plan: typing.Dict[int, typing.Tuple[GridXY, ...]] = {}
+        self.indexes: typing.Dict[int, typing.Tuple[int, ...]] = {}
         self.change_point_for_xy: typing.Dict[GridXY, int] = {}
         self.plan_duration = 0
-
-    def make_plan(self, rng: DeterministicRandom, game_config: GameConfig) -> None:
-        raise NotImplementedError()
-
-    def analyse_plan(self) -> None:
-        for time in sorted(self.plan):
+        self.times = sorted(plan)
+        for time in self.times:
             change_point = time + PLAN_LEADIN_FRAMES
             self.plan_duration = max(self.plan_duration, time + 1)
+            self.plan[time] = tuple(plan[time])
+            self.indexes[time] = tuple((y * width) + x for (x, y) in self.plan[time])
             for xy in self.plan[time]:
                 assert xy not in self.change_point_for_xy, ("A cell may not change twice during a plan")
                 self.change_point_for_xy[xy] = change_point
 
-    def is_leadin(self) -> bool:
-        return self.sequence < PLAN_LEADIN_FRAMES
+def get_brightness_for_change(change_delta: int) -> int:
+    if change_delta > 0:
+        # Change is in the future
+        return max(220 - abs(change_delta * 5), 0)
+    elif change_delta < 0:
+        # Change is in the past
+        return max(220 - abs(change_delta * 25), 0)
+    else:
+        # Change is now
+        return 255
+
+# Range of change_delta values where get_brightness_for_change is non-zero
+BRIGHT_PAST_FRAMES = 220 // 25
+BRIGHT_FUTURE_FRAMES = 220 // 5
+
+schedule_cache: typing.Dict[typing.Any, Schedule] = {}
+
+def get_schedule(pattern_class: typing.Type["BasePattern"],
+                 game_config: GameConfig, geometry: typing.Any) -> Schedule:
+    key = (pattern_class, game_config.width, game_config.height, geometry)
+    schedule = schedule_cache.get(key, None)
+    if schedule is None:
+        if len(schedule_cache) >= MAX_CACHE_SIZE:
+            schedule_cache.clear()
+        schedule_cache[key] = schedule = Schedule(
+                pattern_class.build_plan(game_config, geometry), game_config.width)
+    return schedule
+
+class BasePattern:
+    def __init__(self) -> None:
+        self.schedule = Schedule({}, 1)
+        self.start_frame = 0
+
+    def make_plan(self, rng: DeterministicRandom, game_config: GameConfig) -> None:
+        geometry = self.choose_geometry(rng, game_config)
+        self.schedule = get_schedule(self.__class__, game_config, geometry)
+
+    def choose_geometry(self, rng: DeterministicRandom, game_config: GameConfig) -> typing.Any:
+        # Make the random choices for the pattern, e.g. direction or centre
+        raise NotImplementedError()
+
+    @classmethod
+    def build_plan(cls, game_config: GameConfig, geometry: typing.Any) -> PlanType:
+        # Plan the changes for the given choices
+        raise NotImplementedError()
+
+    @property
+    def plan(self) -> typing.Dict[int, typing.Tuple[GridXY, ...]]:
+        return self.schedule.plan
+
+    @property
+    def change_point_for_xy(self) -> typing.Dict[GridXY, int]:
+        return self.schedule.change_point_for_xy
+
+    @property
+    def plan_duration(self) -> int:
+        return self.schedule.plan_duration
 
-    def is_leadout(self) -> bool:
-        return self.sequence >= (PLAN_LEADIN_FRAMES + self.plan_duration)
+    def get_sequence(self, frame: int) -> int:
+        return frame - self.start_frame
 
-    def is_done(self) -> bool:
-        return self.sequence >= (PLAN_LEADIN_FRAMES + PLAN_LEADOUT_FRAMES + self.plan_duration)
+    def get_end_frame(self) -> int:
+        return self.start_frame + PLAN_LEADIN_FRAMES + PLAN_LEADOUT_FRAMES + self.plan_duration
 
-    def update(self, grid: Grid) -> None:
-        self.sequence += 1
-        for xy in self.plan.get(self.sequence - PLAN_LEADIN_FRAMES, []):
-            grid.update(xy, 1)
+    def is_leadin(self, frame: int) -> bool:
+        return self.get_sequence(frame) < PLAN_LEADIN_FRAMES
 
-    def get_brightness(self, xy: GridXY) -> int:
+    def is_leadout(self, frame: int) -> bool:
+        return self.get_sequence(frame) >= (PLAN_LEADIN_FRAMES + self.plan_duration)
+
+    def is_done(self, frame: int) -> bool:
+        return frame >= self.get_end_frame()
+
+    def apply_plan(self, grid: Grid, time: int) -> None:
+        grid.update_many(self.plan[time], 1)
+
+    def get_brightness(self, xy: GridXY, frame: int) -> int:
         change_point = self.change_point_for_xy.get(xy, -1)
         if change_point < 0:
             return 0 # xy never changes in this plan
 
-        change_delta = change_point - self.sequence
-        if change_delta > 0:
-            # Change is in the future
-            return max(220 - abs(change_delta * 5), 0)
-        elif change_delta < 0:
-            # Change is in the past
-            return max(220 - abs(change_delta * 25), 0)
-        else:
-            # Change is now
-            return 255
+        return get_brightness_for_change(change_point - self.get_sequence(frame))
+
+    def add_brightness(self, brightness_map: "array.array[int]", frame: int) -> None:
+        # Brighten cells in brightness_map (indexed by (y * width) + x) for changes
+        # that are close to the current frame. Other cells are not affected.
+        time_now = self.get_sequence(frame) - PLAN_LEADIN_FRAMES
+        times = self.schedule.times
+        i = bisect.bisect_left(times, time_now - BRIGHT_PAST_FRAMES)
+        while (i < len(times)) and (times[i] <= (time_now + BRIGHT_FUTURE_FRAMES)):
+            brightness = get_brightness_for_change(times[i] - time_now)
+            for index in self.schedule.indexes[times[i]]:
+                if brightness_map[index] < brightness:
+                    brightness_map[index] = brightness
+            i += 1
 
 class HorizontalWipePattern(BasePattern):
-    def make_plan(self, rng: DeterministicRandom, game_config: GameConfig) -> None:
+    def apply_plan(self, grid: Grid, time: int) -> None:
+        # Each step of the plan is one column
+        (x, _) = self.plan[time][0]
+        grid.update_column(x, 1)
+
+    def choose_geometry(self, rng: DeterministicRandom, game_config: GameConfig) -> typing.Any:
         # Determine the direction of the wipe
-        if rng.randrange(0, 2) == 0:
+        return rng.randrange(0, 2)
+
+    @classmethod
+    def build_plan(cls, game_config: GameConfig, geometry: typing.Any) -> PlanType:
+        if geometry == 0:
             dx = -1
             x = game_config.width - 1
         else:
@@ -68,14 +146,25 @@ class HorizontalWipePattern(BasePattern):
             x = 0
 
         # Plan the changes
+        plan: PlanType = {}
         for i in range(game_config.width):
-            self.plan[i * UPDATE_PERIOD_FRAMES] = [(x, y) for y in range(game_config.height)]
+            plan[i * UPDATE_PERIOD_FRAMES] = [(x, y) for y in range(game_config.height)]
             x += dx
+        return plan
 
 class VerticalWipePattern(BasePattern):
-    def make_plan(self, rng: DeterministicRandom, game_config: GameConfig) -> None:
+    def apply_plan(self, grid: Grid, time: int) -> None:
+        # Each step of the plan is one row
+        (_, y) = self.plan[time][0]
+        grid.update_row(y, 1)
+
+    def choose_geometry(self, rng: DeterministicRandom, game_config: GameConfig) -> typing.Any:
         # Determine the direction of the wipe
-        if rng.randrange(0, 2) == 0:
+        return rng.randrange(0, 2)
+
+    @classmethod
+    def build_plan(cls, game_config: GameConfig, geometry: typing.Any) -> PlanType:
+        if geometry == 0:
             dy = -1
             y = game_config.height - 1
         else:
@@ -83,41 +172,40 @@ class VerticalWipePattern(BasePattern):
             y = 0
 
         # Plan the changes
+        plan: PlanType = {}
         for i in range(game_config.height):
-            self.plan[i * UPDATE_PERIOD_FRAMES] = [(x, y) for x in range(game_config.width)]
+            plan[i * UPDATE_PERIOD_FRAMES] = [(x, y) for x in range(game_config.width)]
             y += dy
+        return plan
 
 
 class GrowPattern(BasePattern):
-    def make_plan(self, rng: DeterministicRandom, game_config: GameConfig) -> None:
+    def choose_geometry(self, rng: DeterministicRandom, game_config: GameConfig) -> typing.Any:
         cx = rng.randrange(0, game_config.width)
         cy = rng.randrange(0, game_config.height)
-
-        done: typing.Set[GridXY] = set()
-        i = 0
-        while len(done) != (game_config.width * game_config.height):
-            for y in range(game_config.height):
-                for x in range(game_config.width):
-                    distance = abs(x - cx) + abs(y - cy)
-                    if distance == i:
-                        assert (x, y) not in done
-                        self.plan[i * UPDATE_PERIOD_FRAMES].append((x, y))
-                        done.add((x, y))
-            i += 1
-            assert i < RUNAWAY_LIMIT
+        return (cx, cy)
+
+    @classmethod
+    def build_plan(cls, game_config: GameConfig, geometry: typing.Any) -> PlanType:
+        # Each cell changes at a time proportional to its distance from the centre
+        (cx, cy) = geometry
+        plan: PlanType = collections.defaultdict(lambda: [])
+        for y in range(game_config.height):
+            for x in range(game_config.width):
+                distance = abs(x - cx) + abs(y - cy)
+                plan[distance * UPDATE_PERIOD_FRAMES].append((x, y))
+        return plan
 
 class ShrinkPattern(GrowPattern):
-    def make_plan(self, rng: DeterministicRandom, game_config: GameConfig) -> None:
-        GrowPattern.make_plan(self, rng, game_config)
+    @classmethod
+    def build_plan(cls, game_config: GameConfig, geometry: typing.Any) -> PlanType:
+        old_plan = get_schedule(GrowPattern, game_config, geometry).plan
+        end_time = max(old_plan)
+        plan: PlanType = {}
 
-        old_plan = dict(self.plan)
-        all_keys = sorted(old_plan)
-        end_time = max(all_keys)
-        self.plan.clear()
-
-        for time in all_keys:
-            self.plan[end_time - time] = old_plan[time]
+        for time in old_plan:
+            plan[end_time - time] = list(old_plan[time])
+        return plan
 
 PATTERNS = [GrowPattern, ShrinkPattern,
             VerticalWipePattern, HorizontalWipePattern]
-
@@ -1,3 +1,5 @@
+import typing
+
 from ..game_types import *
 from ..game_database import GameDatabase
 from ..variant import Variant
@@ -5,14 +7,29 @@ from ..font import Font
 from ..images import Images
 
 class BaseState:
+    # Images are loaded in the background, so draw() is given None until they are
+    # ready. States which draw images set uses_images, so that draw() waits for them.
     quit_flag = False
+    uses_images = True
 
     def __init__(self, variant: Variant, game_database: GameDatabase) -> None:
         self.variant = variant
         self.game_database = game_database
+        self.redraw_all = True
+
+    def draw(self, screen_area: SurfaceType, mouse_pos: ScreenXY,
+             images: typing.Optional[Images], font: Font) -> typing.Optional[typing.List[RectType]]:
+        # Return the areas of the screen that changed, or None if the whole screen may have changed
+        return None
+
+    def needs_redraw(self, mouse_pos: ScreenXY) -> bool:
+        # Animated states are drawn on every frame. Other states only need to be drawn
+        # after invalidate() or when something changes, e.g. the mouse moves over a button.
+        return True
 
-    def draw(self, screen_area: SurfaceType, mouse_pos: ScreenXY, images: Images, font: Font) -> None:
-        pass
+    def invalidate(self) -> None:
+        # The whole screen must be drawn next time, e.g. after a resize
+        self.redraw_all = True
 
     def click(self, xy: ScreenXY) -> "BaseState":
         return self
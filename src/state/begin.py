@@ -18,6 +18,8 @@ from .begin_or_end import BeginOrEndState
 
 
 class BeginState(BeginOrEndState):
+    uses_images = True
+
     def __init__(self, variant: Variant, game_database: GameDatabase, level_id: int) -> None:
         BeginOrEndState.__init__(self, variant, game_database, level_id)
 
@@ -63,7 +65,8 @@ class BeginState(BeginOrEndState):
         self.game_database.set_seed_for_level(self.level_id, seed)
         return BeginState(self.variant, self.game_database, self.level_id)
 
-    def draw_info(self, info_area: SurfaceType, images: Images, font: Font) -> None:
+    def draw_info(self, info_area: SurfaceType, images: typing.Optional[Images], font: Font) -> None:
+        assert images is not None
         info_rect = info_area.get_rect()
 
         # Icons showing the level sequence appear at the bottom
@@ -13,7 +13,7 @@ from ..colour import Colour
 from ..game_config import GameConfig
 from ..deterministic_random import DeterministicRandom
 from ..time_conv import time_conv
-from ..draw_button import draw_button
+from ..draw_button import draw_button, get_button_inner_rect
 
 from .base import BaseState
 
@@ -36,6 +36,11 @@ class GamePlayState(BaseState):
         self.game_rect: RectType = Rect(0, 0, 1, 1)
         self.back_button_rect: RectType = Rect(1, 1, 1, 1)
 
+        # What was drawn last time
+        self.screen_size = (0, 0)
+        self.back_button_active = False
+        self.score_drawn: typing.Tuple[str, ColourType] = ("", (0, 0, 0))
+
     def update(self) -> BaseState:
         if self.counter >= self.counter_limit:
             # Run out of time
@@ -52,13 +57,30 @@ class GamePlayState(BaseState):
             self.director.update()
         return self
 
-    def draw(self, screen_area: SurfaceType, mouse_pos: ScreenXY, images: Images, font: Font) -> None:
+    def needs_redraw(self, mouse_pos: ScreenXY) -> bool:
+        # Nothing moves until the first move is made
+        return (self.redraw_all or self.move_made
+                or (get_button_inner_rect(self.back_button_rect).collidepoint(mouse_pos) != self.back_button_active))
+
+    def draw(self, screen_area: SurfaceType, mouse_pos: ScreenXY,
+             images: typing.Optional[Images], font: Font) -> typing.Optional[typing.List[RectType]]:
+        assert images is not None
         if not self.images_filtered:
             images.prepare(self.game_config)
             self.images_filtered = True
+            self.redraw_all = True
 
-        screen_area.fill(self.variant.palette.WINDOW_BG)
         screen_rect = screen_area.get_rect()
+        if screen_rect.size != self.screen_size:
+            self.screen_size = screen_rect.size
+            self.redraw_all = True
+
+        # Only the parts of the screen that changed are drawn, unless redraw_all is set
+        redraw_all = self.redraw_all
+        self.redraw_all = False
+        dirty_rects: typing.List[RectType] = []
+        if redraw_all:
+            screen_area.fill(self.variant.palette.WINDOW_BG)
 
         is_landscape = (screen_rect.width > screen_rect.height)
 
@@ -89,15 +111,20 @@ class GamePlayState(BaseState):
                      expanded_game_rect.height // self.game_config.height)
         self.game_rect = Rect(0, 0, cell_size * self.game_config.width, cell_size * self.game_config.height)
         self.game_rect.center = expanded_game_rect.center
-        self.director.draw(screen_area.subsurface(self.game_rect), images)
+        for cell_rect in self.director.draw(screen_area.subsurface(self.game_rect), images, redraw_all):
+            dirty_rects.append(cell_rect.move(self.game_rect.topleft))
 
         # Draw back button: \u2190 is left arrow
-        draw_button(screen_area=screen_area,
-                button_outer_rect=self.back_button_rect,
-                text=f" \u2190 Back",
-                mouse_pos=mouse_pos,
-                font=font,
-                variant=self.variant)
+        back_button_active = get_button_inner_rect(self.back_button_rect).collidepoint(mouse_pos)
+        if redraw_all or (back_button_active != self.back_button_active):
+            self.back_button_active = back_button_active
+            draw_button(screen_area=screen_area,
+                    button_outer_rect=self.back_button_rect,
+                    text=f" \u2190 Back",
+                    mouse_pos=mouse_pos,
+                    font=font,
+                    variant=self.variant)
+            dirty_rects.append(Rect(self.back_button_rect))
 
         # Score and other status information
         time_left = self.counter_limit - self.counter
@@ -117,12 +144,21 @@ class GamePlayState(BaseState):
         else:
             score_colour = Colour(*self.variant.palette.SCORE_TIME_OUT_FG)
 
-        font.draw(screen_area.subsurface(score_area_rect),
-                  text="   ".join(score_text) if is_landscape else "\n".join(score_text),
-                  colour=score_colour,
-                  horizontal_align=0 if is_landscape else -1,
-                  vertical_align=0 if is_landscape else 1)
-
+        score = ("   ".join(score_text) if is_landscape else "\n".join(score_text), score_colour.get_rgb())
+        if redraw_all or (score != self.score_drawn):
+            self.score_drawn = score
+            score_area = screen_area.subsurface(score_area_rect)
+            score_area.fill(self.variant.palette.WINDOW_BG)
+            font.draw_dynamic(score_area,
+                      text=score[0],
+                      colour=score_colour,
+                      horizontal_align=0 if is_landscape else -1,
+                      vertical_align=0 if is_landscape else 1)
+            dirty_rects.append(score_area_rect)
+
+        if redraw_all:
+            return None
+        return dirty_rects
 
     def click(self, xy: ScreenXY) -> BaseState:
         click_effect = self.director.click(self.game_rect, xy)
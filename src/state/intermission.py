@@ -1,4 +1,5 @@
 import typing
+import pygame
 from pygame import Rect
 
 from ..constants import *
@@ -8,12 +9,15 @@ from ..variant import Variant
 from ..colour import Colour
 from ..font import Font
 from ..images import Images
-from ..draw_button import draw_button
+from ..display_format import display_format
+from ..draw_button import draw_button, get_button_inner_rect
 
 from .base import BaseState
 
 
 class IntermissionState(BaseState):
+    uses_images = False
+
     def __init__(self, variant: Variant, game_database: GameDatabase) -> None:
         BaseState.__init__(self, variant, game_database)
         self.buttons: typing.List[typing.Tuple[str,
@@ -22,8 +26,75 @@ class IntermissionState(BaseState):
         self.info_messages: typing.List[str] = []
         self.headline = ""
         self.info_area_horizontal_align = 0
-
-    def draw(self, screen_area: SurfaceType, mouse_pos: ScreenXY, images: Images, font: Font) -> None:
+        self.active_button = -1
+
+        # The screen is drawn once into static_layer, without any highlighted button.
+        # A highlighted version of each button is drawn into active_layers when needed.
+        self.static_layer: typing.Optional[SurfaceType] = None
+        self.static_layer_display_format_generation = display_format.generation
+        self.active_layers: typing.Dict[int, SurfaceType] = {}
+
+    def get_active_button(self, mouse_pos: ScreenXY) -> int:
+        # Index of the button which is highlighted, or -1 if none
+        for (i, (button_rect, (text, callback, arg))) in enumerate(zip(self.buttons_rects, self.buttons)):
+            if (text != "") and get_button_inner_rect(button_rect).collidepoint(mouse_pos):
+                return i
+        return -1
+
+    def needs_redraw(self, mouse_pos: ScreenXY) -> bool:
+        return self.redraw_all or (self.get_active_button(mouse_pos) != self.active_button)
+
+    def draw(self, screen_area: SurfaceType, mouse_pos: ScreenXY,
+             images: typing.Optional[Images], font: Font) -> typing.Optional[typing.List[RectType]]:
+        redraw_all = self.redraw_all
+        self.redraw_all = False
+
+        screen_size = screen_area.get_size()
+        if ((self.static_layer is None) or (self.static_layer.get_size() != screen_size)
+        or (self.static_layer_display_format_generation != display_format.generation)):
+            self.static_layer = display_format.convert(pygame.Surface(screen_size))
+            self.static_layer_display_format_generation = display_format.generation
+            self.active_layers.clear()
+            self.draw_static(self.static_layer, images, font)
+            redraw_all = True
+
+        # Only the highlighted buttons change
+        active_button = self.get_active_button(mouse_pos)
+        dirty_rects: typing.List[RectType] = []
+        if redraw_all:
+            screen_area.blit(self.static_layer, (0, 0))
+        elif (active_button != self.active_button) and (self.active_button >= 0):
+            button_rect = self.buttons_rects[self.active_button]
+            screen_area.blit(self.static_layer, button_rect, button_rect)
+            dirty_rects.append(Rect(button_rect))
+
+        if (active_button >= 0) and (redraw_all or (active_button != self.active_button)):
+            button_rect = self.buttons_rects[active_button]
+            screen_area.blit(self.get_active_layer(active_button, font), button_rect)
+            dirty_rects.append(Rect(button_rect))
+
+        self.active_button = active_button
+        if redraw_all:
+            return None
+        return dirty_rects
+
+    def get_active_layer(self, button: int, font: Font) -> SurfaceType:
+        active_layer = self.active_layers.get(button, None)
+        if active_layer is None:
+            assert self.static_layer is not None
+            button_rect = self.buttons_rects[button]
+            active_layer = self.static_layer.subsurface(button_rect).copy()
+            layer_button_rect = Rect((0, 0), button_rect.size)
+            draw_button(screen_area=active_layer,
+                    button_outer_rect=layer_button_rect,
+                    text=self.buttons[button][0],
+                    mouse_pos=layer_button_rect.center,
+                    font=font,
+                    variant=self.variant)
+            self.active_layers[button] = active_layer
+        return active_layer
+
+    def draw_static(self, screen_area: SurfaceType, images: typing.Optional[Images], font: Font) -> None:
         screen_rect = screen_area.get_rect()
 
         # Determine space usage on the screen
@@ -47,7 +118,7 @@ class IntermissionState(BaseState):
         buttons_rect.height = buttons_height
         buttons_rect.bottom = screen_rect.height - margin
         buttons_area = screen_area.subsurface(buttons_rect)
-        self.draw_buttons(screen_area, buttons_rect, mouse_pos, font)
+        self.draw_buttons(screen_area, buttons_rect, (-1, -1), font)
 
         # draw info box in the remaining space
         info_rect = Rect(headline_rect)
@@ -60,7 +131,7 @@ class IntermissionState(BaseState):
         info_rect.centerx = headline_rect.centerx
         self.draw_info(screen_area.subsurface(info_rect), images, font)
 
-    def draw_info(self, info_area: SurfaceType, images: Images, font: Font) -> None:
+    def draw_info(self, info_area: SurfaceType, images: typing.Optional[Images], font: Font) -> None:
         font.draw(text_area=info_area, text='\n'.join(self.info_messages),
                   colour=Colour(*self.variant.palette.INFO_FG),
                   horizontal_align=self.info_area_horizontal_align)
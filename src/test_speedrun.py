@@ -1,6 +1,10 @@
 import typing
 import pygame
 import os
+import concurrent.futures
+import csv
+import json
+import time
 from pathlib import Path
 
 from .constants import *
@@ -10,35 +14,125 @@ from .limits import get_counter_limit, get_allowed_counter
 from .game_config import GameConfig
 from .time_conv import time_conv
 
-def test_speedrun(frames_per_move: int) -> int:
-    assert frames_per_move > 0
-    level_id = 1
-    total_counter_for_earlier_levels = 0
-
-    print(f"Frames per move = {frames_per_move}")
-
-    while level_id <= 100:
-        game_config = GameConfig(level_id, 0)
-        counter_limit = get_counter_limit(total_counter_for_earlier_levels, level_id)
-        allowed = get_allowed_counter(level_id)
-        print(f"Level {level_id} w {game_config.width} h {game_config.height} v {game_config.num_values} "
-              f"t {time_conv(counter_limit)} total {time_conv(total_counter_for_earlier_levels)} "
-              f"of {time_conv(allowed)}: ", end="", flush=True)
-        
-        assert game_config.num_values <= MAX_NUM_VALUES
-
-        best: typing.Optional[int] = None
-        for i in range(game_config.num_values):
-            counter = Director(game_config).speedrun(i, frames_per_move, counter_limit)
-            if (counter is not None) and ((best is None) or (counter < best)):
-                best = counter
-
-        if best is None:
-            print("unable to solve")
-            return 0
-
-        counter = best
-        print(f"solved in {time_conv(counter)}")
-        total_counter_for_earlier_levels += counter
-        level_id += 1
+# (frames_per_move, seed, level_id, lock_group)
+SpeedrunJob = typing.Tuple[int, int, int, int]
+
+class SpeedrunResult:
+    def __init__(self, job: SpeedrunJob, counter: typing.Optional[int], wall_time: float) -> None:
+        (self.frames_per_move, self.seed, self.level_id, self.lock_group) = job
+        self.counter = counter
+        self.wall_time = wall_time
+
+        # Set when the results are reported in level order, as the limit
+        # depends on the results for earlier levels
+        self.counter_limit: typing.Optional[int] = None
+        self.within_limit: typing.Optional[bool] = None
+
+    def to_dict(self) -> typing.Dict[str, typing.Any]:
+        game_config = GameConfig(self.level_id, self.seed)
+        return {
+            "frames_per_move": self.frames_per_move,
+            "seed": self.seed,
+            "level_id": self.level_id,
+            "lock_group": self.lock_group,
+            "width": game_config.width,
+            "height": game_config.height,
+            "num_values": game_config.num_values,
+            "counter": self.counter,
+            "counter_limit": self.counter_limit,
+            "within_limit": self.within_limit,
+            "wall_time": self.wall_time,
+        }
+
+def parse_int_list(text: str) -> typing.List[int]:
+    # Parse a list such as "1-10,15,20-25"
+    values: typing.List[int] = []
+    for part in text.split(","):
+        if "-" in part:
+            (low, high) = part.split("-", 1)
+            values.extend(range(int(low), int(high) + 1))
+        elif part:
+            values.append(int(part))
+    return values
+
+def run_speedrun_job(job: SpeedrunJob) -> SpeedrunResult:
+    (frames_per_move, seed, level_id, lock_group) = job
+    game_config = GameConfig(level_id, seed)
+
+    # The time available depends on the results for earlier levels, which may not
+    # be known yet, so allow the most time possible and check the result later
+    counter_limit = get_allowed_counter(level_id)
+    start = time.perf_counter()
+    counter = Director(game_config).speedrun(lock_group, frames_per_move, counter_limit)
+    return SpeedrunResult(job, counter, time.perf_counter() - start)
+
+def test_speedrun(frames_per_move_list: typing.List[int],
+                  level_ids: typing.List[int],
+                  seeds: typing.List[int],
+                  num_workers: typing.Optional[int] = None,
+                  output_path: typing.Optional[Path] = None) -> int:
+    assert len(frames_per_move_list) > 0
+    assert min(frames_per_move_list) > 0
+    assert len(level_ids) > 0
+    assert len(seeds) > 0
+
+    # Every (level, seed, lock group) solve is independent. Jobs are submitted
+    # in level order so that all of the sequences make progress together.
+    sequences = [(frames_per_move, seed) for frames_per_move in frames_per_move_list for seed in seeds]
+    results: typing.List[SpeedrunResult] = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures: typing.Dict[SpeedrunJob, "concurrent.futures.Future[SpeedrunResult]"] = {}
+        for level_id in level_ids:
+            for (frames_per_move, seed) in sequences:
+                game_config = GameConfig(level_id, seed)
+                assert game_config.num_values <= MAX_NUM_VALUES
+                for lock_group in range(game_config.num_values):
+                    job = (frames_per_move, seed, level_id, lock_group)
+                    futures[job] = executor.submit(run_speedrun_job, job)
+
+        # Report each sequence of levels as if they were played in order
+        for (frames_per_move, seed) in sequences:
+            print(f"Frames per move = {frames_per_move} seed = {seed}")
+            total_counter_for_earlier_levels = 0
+            for (i, level_id) in enumerate(level_ids):
+                game_config = GameConfig(level_id, seed)
+                counter_limit = get_counter_limit(total_counter_for_earlier_levels, level_id)
+                allowed = get_allowed_counter(level_id)
+                print(f"Level {level_id} w {game_config.width} h {game_config.height} v {game_config.num_values} "
+                      f"t {time_conv(counter_limit)} total {time_conv(total_counter_for_earlier_levels)} "
+                      f"of {time_conv(allowed)}: ", end="", flush=True)
+
+                best: typing.Optional[int] = None
+                for lock_group in range(game_config.num_values):
+                    result = futures[(frames_per_move, seed, level_id, lock_group)].result()
+                    results.append(result)
+                    counter = result.counter
+                    result.counter_limit = counter_limit
+                    result.within_limit = (counter is not None) and (counter < counter_limit)
+                    if (counter is not None) and result.within_limit and ((best is None) or (counter < best)):
+                        best = counter
+
+                if best is None:
+                    print("unable to solve")
+
+                    # The remaining levels in this sequence will not be reached
+                    for later_level_id in level_ids[i + 1:]:
+                        for lock_group in range(GameConfig(later_level_id, seed).num_values):
+                            futures[(frames_per_move, seed, later_level_id, lock_group)].cancel()
+                    break
+
+                counter = best
+                print(f"solved in {time_conv(counter)}")
+                total_counter_for_earlier_levels += counter
+
+    if output_path is not None:
+        rows = [result.to_dict() for result in results]
+        if output_path.suffix.lower() == ".csv":
+            with open(output_path, "wt", encoding="utf-8", newline="") as fd:
+                writer = csv.DictWriter(fd, fieldnames=list(rows[0]))
+                writer.writeheader()
+                writer.writerows(rows)
+        else:
+            with open(output_path, "wt", encoding="utf-8") as fd:
+                json.dump(rows, fd, indent=1)
     return 0
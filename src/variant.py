@@ -41,6 +41,9 @@ class Constants:
         self.BACK_BUTTON_HEIGHT_DIVISOR = 25
         self.FORCE_WIDTH = 0
         self.FORCE_HEIGHT = 0
+        self.TEXT_CACHE_MEGABYTES = 16
+        self.TILE_CACHE_MEGABYTES = 16
+        self.SCALED_IMAGE_CACHE_MEGABYTES = 32
 
 class Variant:
     def __init__(self, file_name: Path) -> None: